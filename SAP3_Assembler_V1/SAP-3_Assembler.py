@@ -1,24 +1,772 @@
-class SAP3Interpreter:
-    def __init__(self):
-        # Initialize memory, registers, flags, and program counter
-        self.memory = [0] * 512  # 512 bytes memory
-        self.registers = [0] * 16  # 16 general-purpose registers (R0-R15)
+import asyncio
+import collections
+import contextlib
+import functools
+import hashlib
+import io
+import json
+import marshal
+import os
+import platform
+import re
+import struct
+import sys
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # Only SAP3Lanes needs NumPy
+    np = None
+
+# Binary images: assembled code is loaded above the 512-byte data and stack area
+CODE_ORIGIN = 0x200
+IMAGE_MAGIC = b'SAP3'
+IMAGE_VERSION = 1
+
+# Image mode runs PUSH and POP through versions that keep the stack out of the code above it,
+# and JC through one that reports its jump (its target is already the instruction after the label)
+IMAGE_HANDLERS = {'exec_push': 'exec_push_image', 'exec_pop': 'exec_pop_image', 'exec_jc': 'exec_jc_image'}
+
+# Opcode byte and operand layout for every decoded handler
+#   ''   no operand               'r'  register byte           'a'  16-bit address (little endian)
+#   'ra' register and address     'rr' source, dest registers  'ri' register and 8-bit immediate
+#   't'  16-bit jump target       'n'  16-bit NOTE string index
+OPCODES = {
+    'exec_skip':       (0x00, ''),    # NOP
+    'exec_lda':        (0x01, 'a'),   # LDA 0x50
+    'exec_sta':        (0x02, 'a'),   # STA 0x50
+    'exec_ldr':        (0x03, 'ra'),  # LDR R1, 0x50
+    'exec_str':        (0x04, 'ra'),  # STR R1, 0x50
+    'exec_ldri':       (0x05, 'ri'),  # LDRI R1, 10  /  LDI R1, 10
+    'exec_mov':        (0x06, 'rr'),  # MOV R1, R2
+    'exec_mov_to_a':   (0x07, 'r'),   # MOV R1, A
+    'exec_mov_from_a': (0x08, 'r'),   # MOV A, R1
+    'exec_add':        (0x09, 'a'),   # ADD 0x50
+    'exec_add_reg':    (0x0A, 'r'),   # ADD R1
+    'exec_sub':        (0x0B, 'a'),   # SUB 0x50
+    'exec_and':        (0x0C, 'a'),   # AND 0x50
+    'exec_or':         (0x0D, 'a'),   # OR 0x50
+    'exec_xor':        (0x0E, 'a'),   # XOR 0x50
+    'exec_jmp':        (0x10, 't'),   # JMP / JG LOOP
+    'exec_jz':         (0x11, 't'),   # JZ DONE
+    'exec_jnz':        (0x12, 't'),   # JNZ LOOP
+    'exec_jc':         (0x13, 't'),   # JC CARRY_LABEL
+    'exec_jnc':        (0x14, 't'),   # JNC NO_CARRY
+    'exec_cma':        (0x20, ''),    # CMA
+    'exec_inc':        (0x21, ''),    # INC
+    'exec_dec':        (0x22, ''),    # DEC
+    'exec_ral':        (0x23, ''),    # RAL
+    'exec_rar':        (0x24, ''),    # RAR
+    'exec_inp':        (0x30, ''),    # INP
+    'exec_out':        (0x31, ''),    # OUT
+    'exec_out_reg':    (0x32, 'r'),   # OUT R1
+    'exec_push':       (0x40, ''),    # PUSH
+    'exec_pop':        (0x41, ''),    # POP
+    'exec_note':       (0x7F, 'n'),   # NOTE "String to Print"
+    'exec_hlt':        (0xFF, ''),    # HLT
+}
+OPERAND_SIZES = {'': 0, 'r': 1, 'a': 2, 'ra': 3, 'rr': 2, 'ri': 2, 't': 2, 'n': 2}
+
+
+class AssemblyError(ValueError):
+    """Raised when a program can't be encoded to a binary image."""
+
+
+# Flag bits packed into SAP3State.flags
+FLAG_CARRY = 0x01
+FLAG_ZERO = 0x40
+
+# Snapshot header: accumulator, pc, sp, flags, halt, memory size (registers and memory follow)
+STATE_HEADER = struct.Struct('<iiiBBI')
+
+# Interpreter snapshots: magic, version, then the state and the zlib-compressed program metadata
+SNAPSHOT_MAGIC = b'SAP3SNAP'
+SNAPSHOT_VERSION = 1
+
+# Parsed-program cache: one file per source, named by a hash of the source and of this interpreter
+CACHE_MAGIC = b'SAP3CACHE'
+CACHE_VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def interpreter_hash():
+    """Hash of this script, so cached programs are invalidated whenever the interpreter changes."""
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def default_cache_dir():
+    """Cache directory: $SAP3_CACHE_DIR, else ~/.cache/sap3."""
+    return os.environ.get('SAP3_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'sap3')
+
+# Watchdog: instructions between wall-clock checks, and how many state hashes loop detection keeps
+WATCHDOG_INTERVAL = 4096
+LOOP_HISTORY = 1_000_000
+
+# Execution traces: magic and version, then one record per instruction
+#   step, pc, accumulator, memory write address (-1 for none), opcode, flags, written value
+TRACE_MAGIC = b'SAP3TRC'
+TRACE_VERSION = 1
+TRACE_RECORD = struct.Struct('<IIiiBBBx')
+TRACE_BUFFER = 65536  # Records buffered between writes
+TRACE_TEXT = 0xFE  # Opcode recorded for lines run through the text handlers
+TRACE_UNKNOWN = 0xFF  # Opcode recorded for unknown instructions
+
+
+# Memory: the original 512 bytes stay a flat bytearray; larger or banked memories are paged
+DEFAULT_MEMORY_SIZE = 512
+MEMORY_LIMIT = 0x10000  # 16-bit addresses
+PAGE_SHIFT = 8
+PAGE_SIZE = 1 << PAGE_SHIFT
+MEMORY_PAGED = 0x80000000  # Set in the snapshot's memory size field when paged memory follows
+
+# Paged memory in snapshots: size, banks, window start, selected bank, page count (then key and bytes per page)
+PAGED_HEADER = struct.Struct('<IHIHI')
+PAGE_KEY = struct.Struct('<H')
+
+
+class PagedMemory:
+    """Memory of up to 64 KiB in 256-byte pages, each allocated on its first non-zero write.
+
+    With banks > 1, the addresses from window_start up are banked: each bank has its own pages there.
+    Writing to bank_register (the byte just below the window) selects a bank; reading it returns the bank.
+    """
+    __slots__ = ('size', 'pages', 'view', 'banks', 'bank', 'window_start', 'bank_register')
+
+    def __init__(self, size=MEMORY_LIMIT, banks=1, window_start=None):
+        if not 0 < size <= MEMORY_LIMIT:
+            raise ValueError(f"Memory size must be 1 to {MEMORY_LIMIT} bytes")
+        if not 0 < banks <= 256:
+            raise ValueError("Banks must be 1 to 256")
+        self.size = size
+        self.pages = {}  # page number (| bank << 8 inside the window) -> bytearray(PAGE_SIZE)
+        self.banks = banks
+        self.bank = 0
+        if banks > 1:
+            self.window_start = window_start if window_start is not None else (size // 2) & ~(PAGE_SIZE - 1)
+            if not PAGE_SIZE <= self.window_start < size or self.window_start % PAGE_SIZE:
+                raise ValueError("The bank window must start on a page boundary inside memory")
+            self.bank_register = self.window_start - 1
+        else:
+            self.window_start = size
+            self.bank_register = -1  # Never matches: addresses are checked after wrapping
+        self.map_pages()
+
+    def map_pages(self):
+        """Rebuild the page table the CPU sees: one entry per page, None until the page is written."""
+        window = self.window_start >> PAGE_SHIFT
+        count = (self.size + PAGE_SIZE - 1) >> PAGE_SHIFT
+        bank = self.bank << 8
+        self.view = [self.pages.get(page if page < window else page | bank) for page in range(count)]
+
+    def __len__(self):
+        return self.size
+
+    def wrap(self, address):
+        """Wrap negative addresses like a bytearray and check the range."""
+        if address < 0:
+            address += self.size
+        if not 0 <= address < self.size:
+            raise IndexError("memory index out of range")
+        return address
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            return bytes(self[i] for i in range(*address.indices(self.size)))
+        if not 0 <= address < self.size:
+            address = self.wrap(address)
+        if address == self.bank_register:
+            return self.bank
+        page = self.view[address >> PAGE_SHIFT]
+        return page[address & (PAGE_SIZE - 1)] if page is not None else 0
+
+    def __setitem__(self, address, value):
+        if isinstance(address, slice):
+            for i, byte in zip(range(*address.indices(self.size)), value):
+                self[i] = byte
+            return
+        if not 0 <= address < self.size:
+            address = self.wrap(address)
+        if address == self.bank_register:
+            self.bank = value % self.banks
+            self.map_pages()
+            return
+        page = self.view[address >> PAGE_SHIFT]
+        if page is None:
+            if value == 0:
+                return  # Untouched pages already read as zero
+            key = address >> PAGE_SHIFT
+            if address >= self.window_start:
+                key |= self.bank << 8
+            page = self.pages[key] = self.view[address >> PAGE_SHIFT] = bytearray(PAGE_SIZE)
+        page[address & (PAGE_SIZE - 1)] = value
+
+    def touched(self):
+        """Yield (address, page bytes) for the allocated pages the CPU currently sees, in address order."""
+        for key in sorted(self.pages):
+            start = (key & 0xFF) << PAGE_SHIFT
+            if key >> 8 == (self.bank if start >= self.window_start else 0):
+                yield start, self.pages[key]
+
+    def dump(self):
+        """Return the configuration and every non-zero page (all banks) as bytes."""
+        keys = [key for key in sorted(self.pages) if any(self.pages[key])]
+        parts = [PAGED_HEADER.pack(self.size, self.banks, self.window_start, self.bank, len(keys))]
+        for key in keys:
+            parts.append(PAGE_KEY.pack(key))
+            parts.append(self.pages[key])
+        return b''.join(parts)
+
+    def load(self, data, offset=0):
+        """Replace the contents with a dump(), in place."""
+        self.size, self.banks, self.window_start, self.bank, count = PAGED_HEADER.unpack_from(data, offset)
+        self.bank_register = self.window_start - 1 if self.banks > 1 else -1
+        offset += PAGED_HEADER.size
+        self.pages = {}
+        for _ in range(count):
+            (key,) = PAGE_KEY.unpack_from(data, offset)
+            offset += PAGE_KEY.size
+            self.pages[key] = bytearray(data[offset:offset + PAGE_SIZE])
+            offset += PAGE_SIZE
+        self.map_pages()
+
+
+def memory_rows(memory):
+    """Yield (address, 16 bytes) for each memory row holding a non-zero byte; paged memory only visits its pages."""
+    if isinstance(memory, PagedMemory):
+        pages = memory.touched()
+    else:
+        pages = [(0, memory)]
+    for start, page in pages:
+        for i in range(0, len(page), 16):
+            row = page[i:i + 16]
+            if any(row):
+                yield start + i, row
+
+
+class SAP3State:
+    """Machine state: memory and registers as byte arrays, accumulator, PC, SP and a packed flags byte."""
+    __slots__ = ('memory', 'registers', 'accumulator', 'pc', 'sp', 'flags', 'halt')
+
+    def __init__(self, memory_size=DEFAULT_MEMORY_SIZE, banks=1):
+        if memory_size > DEFAULT_MEMORY_SIZE or banks > 1:
+            self.memory = PagedMemory(memory_size, banks)  # Pages are allocated as they are written
+        else:
+            self.memory = bytearray(memory_size)  # 512 bytes memory
+        self.registers = bytearray(16)  # 16 general-purpose registers (R0-R15)
         self.accumulator = 0  # Accumulator register
         self.pc = 0  # Program counter
-        self.sp = 511  # Stack pointer (start at the end of memory)
+        if banks > 1:
+            self.sp = self.memory.bank_register - 1  # Stack pointer (start just below the bank register)
+        else:
+            self.sp = memory_size - 1  # Stack pointer (start at the end of memory)
+        self.flags = 0  # FLAG_CARRY | FLAG_ZERO
         self.halt = False  # Halt flag
-        
-        # Initialize flags
-        self.flags = {
-            'Carry': False,
-            'Zero': False,
-        }
+
+    def snapshot(self):
+        """Return the whole state as one bytes object."""
+        memory = self.memory
+        if isinstance(memory, PagedMemory):
+            header = STATE_HEADER.pack(self.accumulator, self.pc, self.sp, self.flags, self.halt, MEMORY_PAGED)
+            return b''.join((header, self.registers, memory.dump()))
+        header = STATE_HEADER.pack(self.accumulator, self.pc, self.sp, self.flags, self.halt, len(memory))
+        return b''.join((header, self.registers, memory))
+
+    def restore(self, data):
+        """Restore the state from a snapshot() bytes object."""
+        self.accumulator, self.pc, self.sp, self.flags, halt, memory_size = STATE_HEADER.unpack_from(data)
+        self.halt = bool(halt)
+        offset = STATE_HEADER.size
+        self.registers[:] = data[offset:offset + 16]
+        if memory_size & MEMORY_PAGED:
+            if not isinstance(self.memory, PagedMemory):
+                self.memory = PagedMemory()
+            self.memory.load(data, offset + 16)
+        else:
+            if not isinstance(self.memory, bytearray):
+                self.memory = bytearray(memory_size)
+            self.memory[:] = data[offset + 16:offset + 16 + memory_size]
+
+
+# Basic-block compiler: Python source for each decoded handler it can inline.
+# Each entry is (lines for the operand, effect): 'zero' means the Zero flag now follows the
+# accumulator, 'acc' means the accumulator changes without touching the flags.
+NOT_ZERO = ~FLAG_ZERO & 0xFF
+NOT_CARRY = ~FLAG_CARRY & 0xFF
+ADD_LINES = ["if acc > 255:", "    acc -= 255", f"    flags |= {FLAG_CARRY}", "else:", f"    flags &= {NOT_CARRY}"]
+COMPILED_OPS = {
+    'exec_skip':       (lambda op: [], None),
+    'exec_lda':        (lambda a: [f"acc = mem[{a}]"], 'zero'),
+    'exec_sta':        (lambda a: [f"mem[{a}] = acc & 0xFF"], None),
+    'exec_ldr':        (lambda op: [f"regs[{op[0]}] = mem[{op[1]}]"], None),
+    'exec_str':        (lambda op: [f"mem[{op[1]}] = regs[{op[0]}]"], None),
+    'exec_ldri':       (lambda op: [f"regs[{op[0]}] = {op[1]}"], None),
+    'exec_mov':        (lambda op: [f"regs[{op[1]}] = regs[{op[0]}]"], None),
+    'exec_mov_to_a':   (lambda r: [f"acc = regs[{r}]"], 'acc'),
+    'exec_mov_from_a': (lambda r: [f"regs[{r}] = acc & 0xFF"], None),
+    'exec_add':        (lambda a: [f"acc += mem[{a}]"] + ADD_LINES, 'zero'),
+    'exec_add_reg':    (lambda r: [f"acc += regs[{r}]"] + ADD_LINES, 'zero'),
+    'exec_sub':        (lambda a: [f"acc -= mem[{a}]"], 'zero'),
+    'exec_and':        (lambda a: [f"acc &= mem[{a}]"], 'zero'),
+    'exec_or':         (lambda a: [f"acc |= mem[{a}]"], 'zero'),
+    'exec_xor':        (lambda a: [f"acc ^= mem[{a}]"], 'zero'),
+    'exec_cma':        (lambda op: ["acc = ~acc & 0xFF"], 'zero'),
+    'exec_inc':        (lambda op: ["acc = (acc + 1) & 0xFF"], 'zero'),
+    'exec_dec':        (lambda op: ["acc = (acc - 1) & 0xFF"], 'zero'),
+    'exec_ral':        (lambda op: ["acc = ((acc << 1) & 0xFF) | (acc >> 7)"], 'zero'),
+    'exec_rar':        (lambda op: ["acc = (acc >> 1) | ((acc & 1) << 7)"], 'zero'),
+    'exec_inp':        (lambda op: ["acc = read_input()"], 'zero'),
+    'exec_out':        (lambda op: ["write_output(acc)"], None),
+    'exec_out_reg':    (lambda r: [f"write_output(regs[{r}])"], None),
+    'exec_push':       (lambda op: ["mem[sp] = acc & 0xFF", "sp -= 1"], None),
+    'exec_pop':        (lambda op: ["sp += 1", "acc = mem[sp]"], 'zero'),
+}
+
+# Jumps end a block: condition on the flags for taking the jump
+COMPILED_JUMPS = {
+    'exec_jmp': "True",
+    'exec_jz':  f"flags & {FLAG_ZERO}",
+    'exec_jnz': f"not flags & {FLAG_ZERO}",
+    'exec_jc':  f"flags & {FLAG_CARRY}",
+    'exec_jnc': f"not flags & {FLAG_CARRY}",
+}
+
+
+# I/O ports for INP and OUT
+class InputPort:
+    """Values for INP, read from bytes, a binary file, an iterable or generator, or a callback.
+
+    Once the source runs dry INP reads 0 and eof is set.
+    """
+
+    def __init__(self, source):
+        if callable(source):
+            self.values = iter(source, None)  # Call the callback for every INP
+        elif isinstance(source, (bytes, bytearray)):
+            self.values = iter(source)
+        elif hasattr(source, 'read'):
+            self.values = self.read_chunks(source)
+        else:
+            self.values = iter(source)
+        self.eof = False
+
+    @classmethod
+    def from_file(cls, filename):
+        """Feed INP with the bytes of a file ('-' for stdin)."""
+        return cls(sys.stdin.buffer if filename == '-' else open(filename, 'rb'))
+
+    @staticmethod
+    def read_chunks(f, size=65536):
+        """Yield the bytes of a binary file one at a time, reading it in large chunks."""
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield from chunk
+
+    def read(self):
+        value = next(self.values, None)
+        if value is None:
+            self.eof = True
+            return 0
+        return value & 0xFF
+
+
+class OutputPort:
+    """Collects OUT values and hands them to a sink in bulk.
+
+    The sink can be None (values pile up in self.values), a callable taking a list of values,
+    a binary file (values written as bytes), or a text file (written as 'Output: N' lines).
+    """
+
+    def __init__(self, sink=None, buffer_size=4096):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self.values = []
+
+    def write(self, value):
+        self.values.append(value)
+        if self.sink is not None and len(self.values) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.sink is None or not self.values:
+            return
+        values, self.values = self.values, []
+        if callable(self.sink):
+            self.sink(values)
+        elif isinstance(self.sink, io.TextIOBase):
+            self.sink.write(''.join(f"Output: {value}\n" for value in values))
+        else:
+            self.sink.write(bytes(value & 0xFF for value in values))
+
+
+class InputPending(Exception):
+    """Raised by INP when an AsyncInputPort has no value yet; the INP runs again once one arrives."""
+
+
+class AsyncInputPort(InputPort):
+    """Values for INP fed from coroutines with feed().
+
+    While the queue is empty INP waits (see SAP3Machine) instead of reading 0; after close() it reads 0 and sets eof.
+    """
+
+    def __init__(self):
+        self.queue = collections.deque()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.eof = False
+
+    def feed(self, *values):
+        self.queue.extend(values)
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    def read(self):
+        if self.queue:
+            return self.queue.popleft() & 0xFF
+        if self.closed:
+            self.eof = True
+            return 0
+        raise InputPending
+
+    async def wait(self):
+        while not self.queue and not self.closed:
+            self.ready.clear()
+            await self.ready.wait()
+
+
+class Watchdog:
+    """Wall-clock deadline and loop detection for the execution loops.
+
+    The loops call repeated() after every backward jump (a PC at or before the instruction that ran)
+    and expired() every WATCHDOG_INTERVAL instructions.
+    """
+
+    def __init__(self, time_limit=None, detect_loops=False, input_port=None):
+        self.deadline = time.monotonic() + time_limit if time_limit is not None else None
+        # A repeated state only means an endless loop if nothing outside the machine can change it
+        self.seen = set() if detect_loops and input_port is None else None
+        self.candidates = {}  # hash -> snapshots whose hash was seen before, kept to compare exactly
+
+    def repeated(self, st):
+        """True if the whole machine state is exactly one it has been in before.
+
+        Only hashes are kept for most states. When a hash comes round again, that state's bytes are
+        kept too. A machine in a real loop returns to the same state on the next pass, and the bytes
+        confirm it. A hash collision between different states never stops the run.
+        """
+        if self.seen is None:
+            return False
+        state = st.snapshot()
+        key = hash(state)
+        if key in self.seen:
+            states = self.candidates.setdefault(key, set())
+            if state in states:
+                return True
+            states.add(state)
+            return False
+        if len(self.seen) >= LOOP_HISTORY:
+            self.seen.clear()  # Loops shorter than LOOP_HISTORY iterations are still caught
+            self.candidates.clear()
+        self.seen.add(key)
+        return False
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def check(self, st, pc, steps):
+        """Stop reason ('loop' or 'timeout') after the instruction at pc, or None to keep going."""
+        if st.pc <= pc and self.repeated(st):
+            return 'loop'
+        if not steps % WATCHDOG_INTERVAL and self.expired():
+            return 'timeout'
+        return None
+
+
+# Preprocessor: INCLUDE, MACRO/ENDM and EQU, expanded before parse_lines sees the source
+MAX_MACRO_DEPTH = 32
+
+
+class Preprocessor:
+    """Expands INCLUDE, MACRO/ENDM and EQU into flat SAP-3 source lines.
+
+    Every file's expansion is kept together with the definitions it saw on entry, so expanding
+    again only redoes the files that changed on disk (or whose incoming definitions changed).
+    """
+
+    def __init__(self):
+        self.sources = {}  # path -> (signature, [(line number, text)])
+        self.units = {}  # path -> expansion of that file, see expand_file
+        self.dependencies = {}  # Files the last expand() read, with their signatures
+        self.expanded = self.reused = 0  # Files expanded and reused by the last expand()
+
+    @staticmethod
+    def signature(path):
+        """Cheap change check for a file: modification time and size."""
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def read(self, path):
+        """Return a file's signature and its comment-stripped, non-empty lines, re-reading it only if it changed."""
+        signature = self.signature(path)
+        cached = self.sources.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached
+        lines = []
+        with open(path, 'r') as f:
+            for number, line in enumerate(f, 1):
+                if ';' in line:
+                    line = line[:line.index(';')]
+                line = line.strip()
+                if line:
+                    lines.append((number, line))
+        self.sources[path] = (signature, lines)
+        return self.sources[path]
+
+    def expand(self, filename):
+        """Expand a source file and everything it includes into a list of program lines."""
+        self.expanded = self.reused = 0
+        env = {'macros': {}, 'equ': {}, 'count': 0, 'key': 0}
+        path = os.path.abspath(filename)
+        lines, deps, defines = self.expand_file(path, env, ())
+        self.dependencies = {path: self.sources[path][0], **deps}
+        return lines
+
+    def expand_file(self, path, env, stack):
+        """Expand one file; returns (lines, files it included with their signatures, definitions it made)."""
+        if path in stack:
+            raise AssemblyError(f"{path}: circular INCLUDE")
+        signature, lines = self.read(path)
+        unit = self.units.get(path)
+        if unit is not None and unit['signature'] == signature and unit['key_in'] == env['key']:
+            try:
+                unchanged = all(self.signature(dep) == sig for dep, sig in unit['deps'].items())
+            except OSError:
+                unchanged = False
+            if unchanged:
+                # Same file, same definitions coming in: replay what it defined and reuse its lines
+                for kind, name, value in unit['defines']:
+                    env['macros' if kind == 'macro' else 'equ'][name] = value
+                env['count'], env['key'] = unit['count_out'], unit['key_out']
+                self.reused += 1
+                return unit['lines'], unit['deps'], unit['defines']
+
+        key_in = env['key']
+        out, deps, defines = [], {}, []
+        self.expand_lines(lines, path, env, stack + (path,), out, deps, defines, 0)
+        self.units[path] = {'signature': signature, 'key_in': key_in, 'lines': out, 'deps': deps, 'defines': defines,
+                            'count_out': env['count'], 'key_out': env['key']}
+        self.expanded += 1
+        return out, deps, defines
+
+    def define(self, env, defines, kind, name, value):
+        """Record an EQU constant or a macro."""
+        env['macros' if kind == 'macro' else 'equ'][name] = value
+        env['key'] = hash((env['key'], kind, name, value))
+        defines.append((kind, name, value))
+
+    @staticmethod
+    def substitute(line, equ):
+        """Replace EQU constants in an instruction's operands (NOTE text is left alone)."""
+        parts = line.split(None, 1)
+        if not equ or len(parts) < 2 or parts[0].upper() == 'NOTE':
+            return line
+        operands = re.sub(r'\w+', lambda m: equ.get(m.group(), m.group()), parts[1])
+        return f"{parts[0]} {operands}"
+
+    def expand_lines(self, lines, path, env, stack, out, deps, defines, depth):
+        """Expand (line number, text) pairs from path into out, following directives and macro calls."""
+        lines = iter(lines)
+        for number, line in lines:
+            where = f"{path}:{number}"
+            label = None
+            if ':' in line and not line.startswith("NOTE"):
+                label, rest = line.split(':', 1)
+                rest = rest.strip()
+                if not rest:
+                    out.append(line)
+                    continue
+            else:
+                rest = line
+            parts = rest.split(None, 1)
+            word = parts[0].upper()
+            args = parts[1].strip() if len(parts) > 1 else ''
+
+            if word == 'INCLUDE':
+                if not args:
+                    raise AssemblyError(f"{where}: INCLUDE needs a file name")
+                target = os.path.normpath(os.path.join(os.path.dirname(path), args.strip('"\'')))
+                try:
+                    sub_lines, sub_deps, sub_defines = self.expand_file(target, env, stack)
+                except OSError as e:
+                    raise AssemblyError(f"{where}: can't include {args}: {e.strerror}") from None
+                if label is not None:
+                    out.append(f"{label}:")
+                out.extend(sub_lines)
+                deps[target] = self.sources[target][0]
+                deps.update(sub_deps)
+                defines.extend(sub_defines)
+            elif word == 'MACRO':
+                names = args.split(None, 1)
+                if not names:
+                    raise AssemblyError(f"{where}: MACRO needs a name")
+                params = tuple(p.strip() for p in names[1].split(',')) if len(names) > 1 else ()
+                body = []
+                for body_line in lines:
+                    if body_line[1].upper() == 'ENDM':
+                        break
+                    body.append(body_line)
+                else:
+                    raise AssemblyError(f"{where}: MACRO {names[0]} has no ENDM")
+                self.define(env, defines, 'macro', names[0].upper(), (params, tuple(body), path))
+            elif word == 'ENDM':
+                raise AssemblyError(f"{where}: ENDM without MACRO")
+            elif args.upper().startswith('EQU') and args[3:4].isspace():
+                value = self.substitute(f"EQU {args[3:].strip()}", env['equ']).split(None, 1)[1]
+                self.define(env, defines, 'equ', parts[0], value)
+            elif word in env['macros']:
+                params, body, source = env['macros'][word]
+                values = [a.strip() for a in args.split(',')] if args else []
+                if len(values) != len(params):
+                    raise AssemblyError(f"{where}: {parts[0]} takes {len(params)} arguments, got {len(values)}")
+                if depth >= MAX_MACRO_DEPTH:
+                    raise AssemblyError(f"{where}: macros nested more than {MAX_MACRO_DEPTH} deep")
+                # Each expansion gets its own number for \@, so labels inside macros stay unique
+                env['count'] += 1
+                env['key'] = hash((env['key'], env['count']))
+                mapping = dict(zip(params, values))
+                suffix = f"_{env['count']}"
+                expanded = []
+                for body_number, body_line in body:
+                    if mapping:
+                        body_line = re.sub(r'\w+', lambda m: mapping.get(m.group(), m.group()), body_line)
+                    expanded.append((body_number, body_line.replace('\\@', suffix)))
+                if label is not None:
+                    out.append(f"{label}:")
+                self.expand_lines(expanded, source, env, stack, out, deps, defines, depth + 1)
+            else:
+                substituted = self.substitute(rest, env['equ'])
+                if substituted is rest:
+                    out.append(line)
+                else:
+                    out.append(substituted if label is None else f"{label}: {substituted}")
+
+
+# NOTE templates: each message is parsed once into a formatter taking the machine state
+NOTE_PREFIX = "Note  :------------------"
+NOTE_SLOT = re.compile(r'\{(R1[0-5]|R[0-9]|A|F|C|Z|SP|0[xX][0-9A-Fa-f]{1,4})\}')
+
+
+@functools.lru_cache(maxsize=None)
+def compile_note(message):
+    """Compile a NOTE message into a function st -> printed line.
+
+    Slots: {R0}..{R15}, {A} (accumulator), {F} (flags byte), {C} and {Z} (flags as 0/1), {SP}, and {0xNN} for any
+    memory address. Anything else in braces is printed as written.
+    """
+    parts = []
+    values = []
+    position = 0
+    for match in NOTE_SLOT.finditer(message):
+        slot = match.group(1)
+        if slot[0] == 'R':
+            value = f"r[{int(slot[1:])}]"
+        elif slot in ('A', 'F', 'C', 'Z', 'SP'):
+            value = {'A': "st.accumulator", 'F': "st.flags", 'C': f"(st.flags & {FLAG_CARRY}) and 1",
+                     'Z': f"(st.flags & {FLAG_ZERO}) and 1", 'SP': "st.sp"}[slot]
+        else:
+            address = int(slot, 16)
+            value = f"m[{address}]"
+            if address >= DEFAULT_MEMORY_SIZE:
+                value = f"(m[{address}] if {address} < len(m) else {match.group()!r})"  # Beyond a small memory
+        parts.append(message[position:match.start()].replace('{', '{{').replace('}', '}}'))
+        parts.append('{}')
+        values.append(value)
+        position = match.end()
+    parts.append(message[position:].replace('{', '{{').replace('}', '}}'))
+    template = NOTE_PREFIX + ''.join(parts)
+    if not values:
+        line = template.replace('{{', '{').replace('}}', '}')
+        return lambda st: line
+    source = f"lambda st: (lambda r, m: {template!r}.format({', '.join(values)}))(st.registers, st.memory)"
+    return eval(source)
+
+
+class LogSink:
+    """Collects NOTE lines and hands them to a sink in bulk.
+
+    The sink can be None (lines pile up in self.lines), a callable taking a list of lines, or a text file.
+    """
+
+    def __init__(self, sink=None, buffer_size=1024):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+        if self.sink is not None and len(self.lines) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.sink is None or not self.lines:
+            return
+        lines, self.lines = self.lines, []
+        if callable(self.sink):
+            self.sink(lines)
+        else:
+            self.sink.write('\n'.join(lines) + '\n')
+
+
+def state_property(name):
+    """Expose one SAP3State slot as an interpreter attribute."""
+    return property(lambda self: getattr(self.state, name), lambda self, value: setattr(self.state, name, value))
+
+
+class SAP3Interpreter:
+    # Memory, registers, flags, and program counter live in self.state
+    memory = state_property('memory')
+    registers = state_property('registers')
+    accumulator = state_property('accumulator')
+    pc = state_property('pc')
+    sp = state_property('sp')
+    halt = state_property('halt')
+
+    def __init__(self, state=None):
+        # Initialize the machine state (one SAP3State can be swapped for another between runs)
+        self.state = state if state is not None else SAP3State()
 
         # for Troubleshooting the code!
         self.DEBUG = False  # SYNTAX:  True or False"
 		
-        # Initialize labels (empty dictionary)
+        # Initialize labels (empty dictionary), the source program and its decoded form
         self.labels = {}
+        self.program = []
+        self.decoded = []
+        self.blocks = []
+
+        # Instructions executed by the last run and why it stopped ('halt', 'end', 'budget', 'timeout' or 'loop')
+        self.steps = 0
+        self.stop_reason = None
+        self.code_start = self.code_end = None  # Set by load_image
+        self.profile = None  # Per-line counts and times from execute_program(profile=True)
+
+        # Reused between parse_program calls, so parsing again only redoes what changed
+        self.preprocessor = Preprocessor()
+        self.decode_cache = {}  # (line, fast, memory size) -> record, for lines that don't refer to labels
+        self.verified = None  # (decoded, records with checks removed) from SAP3Analyzer.apply()
+
+        # I/O ports for INP and OUT (see InputPort and OutputPort)
+        self.input_port = None
+        self.output_port = None
+        self.note_log = None  # A LogSink for NOTE lines; None prints them
         
         # Instruction set with their implementations
         self.instructions = {
@@ -59,7 +807,7 @@ class SAP3Interpreter:
             'RAR': self.rar,   # Rotate accumulator right..............................SYNTAX: RAR
 
             # --- 7. I/O Operations ---
-            'INP': self.inp,   # Input value to accumulator (placeholder)..............SYNTAX: INP
+            'INP': self.inp,   # Input value to accumulator from the input port........SYNTAX: INP
             'OUT': self.out,   # Output value of accumulator...........................SYNTAX: OUT
 
             # --- 8. Program Control ---
@@ -73,6 +821,56 @@ class SAP3Interpreter:
             'NOTE': self.note  # Prints Notes to screen. Not part of the Assembler.....SYNTAX: NOTE "String to Print"
         }
 
+        # Decoders for the instruction set, used by decode_program (anything missing runs as text)
+        self.decoders = {
+            'NOP': self.decode_none(self.exec_skip),
+            'LDA': self.decode_mem(self.exec_lda),
+            'STA': self.decode_sta,
+            'LDR': self.decode_ldr,
+            'STR': self.decode_str,
+            'LDRI': self.decode_ldri,
+            'LDI': self.decode_ldi,
+            'MOV': self.decode_mov,
+            'ADD': self.decode_add,
+            'SUB': self.decode_mem(self.exec_sub),
+            'AND': self.decode_mem(self.exec_and),
+            'OR': self.decode_mem(self.exec_or),
+            'XOR': self.decode_mem(self.exec_xor),
+            'JMP': self.decode_jump(self.exec_jmp),
+            'JG': self.decode_jg,
+            'JZ': self.decode_jump(self.exec_jz),
+            'JNZ': self.decode_jump(self.exec_jnz),
+            'JC': self.decode_jc,
+            'JNC': self.decode_jump(self.exec_jnc),
+            'CMA': self.decode_none(self.exec_cma),
+            'INC': self.decode_none(self.exec_inc),
+            'DEC': self.decode_none(self.exec_dec),
+            'RAL': self.decode_none(self.exec_ral),
+            'RAR': self.decode_none(self.exec_rar),
+            'INP': self.decode_none(self.exec_inp),
+            'OUT': self.decode_out,
+            'HLT': self.decode_none(self.exec_hlt),
+            'PUSH': self.decode_none(self.exec_push),
+            'POP': self.decode_none(self.exec_pop),
+            'NOTE': self.decode_note,
+        }
+
+    @property
+    def zero_flag(self):
+        return bool(self.state.flags & FLAG_ZERO)
+
+    @zero_flag.setter
+    def zero_flag(self, value):
+        self.state.flags = (self.state.flags & ~FLAG_ZERO) | (FLAG_ZERO if value else 0)
+
+    @property
+    def carry_flag(self):
+        return bool(self.state.flags & FLAG_CARRY)
+
+    @carry_flag.setter
+    def carry_flag(self, value):
+        self.state.flags = (self.state.flags & ~FLAG_CARRY) | (FLAG_CARRY if value else 0)
+
     # Sample operation implementations for instructions
     def ldr(self, args):
         """Load a value from memory into a register."""
@@ -83,7 +881,7 @@ class SAP3Interpreter:
 
     def push(self, args):
         """Push the value from the accumulator to the stack (memory)"""
-        self.memory[self.sp] = self.accumulator
+        self.memory[self.sp] = self.accumulator & 0xFF
         self.sp -= 1  # Move the stack pointer down (towards lower memory addresses)
         return False
 
@@ -125,7 +923,7 @@ class SAP3Interpreter:
                     self.halt = True    
                     return False
                 # Move value from accumulator to register
-                self.registers[dest_reg] = self.accumulator
+                self.registers[dest_reg] = self.accumulator & 0xFF
 
             else:
                 # Regular register-to-register move
@@ -174,7 +972,7 @@ class SAP3Interpreter:
         try:
             # Handle hexadecimal addresses (e.g., 0x00, 0xFF)
             address = int(args[0], 16)  # This allows both decimal and hexadecimal input
-            if address < 0 or address >= 512:
+            if address < 0 or address >= len(self.memory):
                 print(f"Error: Address {address} out of range.")
                 self.halt = True
                 return False
@@ -184,7 +982,7 @@ class SAP3Interpreter:
             return False
 
         # Store the value in the accumulator (A) into the specified memory address
-        self.memory[address] = self.accumulator
+        self.memory[address] = self.accumulator & 0xFF
         if self.DEBUG: print(f"STA: Stored value {self.accumulator} into memory address {address}")
     
         return False
@@ -210,7 +1008,7 @@ class SAP3Interpreter:
             # Check if the argument is a memory address (e.g., 0x00, 0x02, etc.)
             else:
                 address = int(args[0], 16)  # Convert the memory address (e.g., 0x02) from hex to decimal
-                if address < 0 or address >= 512:
+                if address < 0 or address >= len(self.memory):
                     print(f"Error: Address {address} out of range.")
                     self.halt = True
                     return False
@@ -220,15 +1018,12 @@ class SAP3Interpreter:
             # Check for overflow (if the accumulator exceeds the max value for an 8-bit number)
             if self.accumulator > 255:
                 self.accumulator -= 255  # Wrap around the 8-bit value
-                self.flags['Carry'] = True  # Set the Carry flag
+                self.carry_flag = True  # Set the Carry flag
             else:
-                self.flags['Carry'] = False  # Clear the Carry flag
+                self.carry_flag = False  # Clear the Carry flag
 
             # Check if the accumulator is zero (for Zero flag)
-            if self.accumulator == 0:
-                self.flags['Zero'] = True
-            else:
-                self.flags['Zero'] = False
+            self.zero_flag = (self.accumulator == 0)
 
         except (ValueError, IndexError) as e:
             print(f"Error processing ADD instruction: {e}")
@@ -311,7 +1106,7 @@ class SAP3Interpreter:
     
         label = args[0]  # The label to jump to
     
-        if self.flags['Carry']:  # Check the Carry flag in the flags dictionary
+        if self.carry_flag:  # Check the Carry flag
             if label in self.labels:
                 self.pc = self.labels[label]  # Set the program counter to the label address    
                 if self.DEBUG: print(f"JC: Jumping to label {label} (Address {self.pc})")
@@ -365,8 +1160,8 @@ class SAP3Interpreter:
         return False
 
     def inp(self, args):
-        """Input value (simulated as zero for now)."""
-        self.accumulator = 0  # Placeholder for actual input
+        """Input value from the input port (zero when none is attached)."""
+        self.accumulator = self.read_input()
         self.zero_flag = (self.accumulator == 0)
         return False
 
@@ -377,11 +1172,11 @@ class SAP3Interpreter:
             reg_num = int(reg[1:])  # Convert "R0" to 0, "R1" to 1, etc.
 
             if 0 <= reg_num <= 15:  # Ensure valid register range
-                print(f"Output: {self.registers[reg_num]}")
+                self.write_output(self.registers[reg_num])
             else:
                 print(f"Error: Invalid register {reg}")
         else:
-            print(f"Output: {self.accumulator}")  # If no argument, print accumulator
+            self.write_output(self.accumulator)  # If no argument, output accumulator
         return False
 
     def hlt(self, args):
@@ -454,7 +1249,7 @@ class SAP3Interpreter:
                 return False
 
             # Load the immediate value into the specified register
-            self.registers[reg] = value
+            self.registers[reg] = value & 0xFF
             if self.DEBUG: print(f"LDI: Loaded immediate value {value} into R{reg}")
 
         except (ValueError, IndexError) as e:
@@ -474,33 +1269,28 @@ class SAP3Interpreter:
 
         message = ' '.join(args)  # Join all arguments into a single string (in case the message has spaces)
 
-        if '{' in message and '}' in message:    # If message contains placeholders 
-
-            # Replace placeholders for registers R0 to R15 and A (accumulator)
-            for i in range(16):  # For registers R0 to R15
-                #print(f"FOR: [{self.registers[i]}]")
-                message = message.replace(f"{{R{i}}}", str(self.registers[i]))
-    
-            # Replace the placeholder for the accumulator (A)
-            message = message.replace("{A}", str(self.accumulator))
-
-            # Replace placeholders for memory locations like {0x01}, {0x02}, ..., dynamically
-            # We will look for patterns like {0x01}, {0x02}, and replace them with corresponding memory values
-            for i in range(16):  # This example assumes memory is 16 locations, you can expand it if needed
-                message = message.replace(f"{{0x{i:02X}}}", str(self.memory[i]))  # Format as {0x01}, {0x02}, etc.
-
-        print(f"Note  :------------------{message}")  # Print the message with a "NOTE" prefix for clarity
+        # Placeholders like {R1}, {A} or {0x20} are filled in by the message's compiled template
+        self.write_note(compile_note(message)(self.state))
         return False
 
+    def write_note(self, line):
+        if self.note_log is None:
+            print(line)
+        else:
+            self.note_log.write(line)
+
     # Method to parse the program from a file
     def parse_program(self, filename):
-        """Parse a SAP-3 ASM file"""
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-    
+        """Parse a SAP-3 ASM file, expanding INCLUDE, MACRO and EQU first"""
+        # Parsing again reuses the preprocessor's per-file results and the decoded lines
+        self.parse_lines(self.preprocessor.expand(filename))
+
+    def parse_lines(self, lines):
+        """Parse SAP-3 source lines into the program and label table, then decode them."""
         # First pass: collect labels
         line_num = 0
         self.program = []
+        self.labels = {}
 
         for line in lines:
             # Remove comments and trim whitespace
@@ -530,6 +1320,55 @@ class SAP3Interpreter:
                 if self.DEBUG: print(f"Added to program: {line.strip()} at address {line_num}")  # Debugging message   
                 line_num += 1
 
+        # Decode once, so execution never re-parses the text
+        self.decode_program()
+
+    def load_program(self, filename, cache_dir=None):
+        """Parse a SAP-3 ASM file, using the on-disk cache when it holds this exact source."""
+        with open(filename, 'rb') as f:
+            source = f.read()
+        if self.DEBUG:
+            # DEBUG decodes everything through the text handlers, so it never uses the cache
+            self.parse_program(filename)
+            return False
+        # marshal's format can change between Python versions, so the version is part of the key too.
+        # Decoded addresses are checked against the memory size, so the memory layout is as well
+        layout = f"{len(self.memory)}:{getattr(self.memory, 'banks', 1)}".encode()
+        key = hashlib.sha256(interpreter_hash() + sys.version.encode() + layout + source).hexdigest()
+        path = os.path.join(cache_dir or default_cache_dir(), key + '.sap3c')
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data[:len(CACHE_MAGIC)] == CACHE_MAGIC and data[len(CACHE_MAGIC)] == CACHE_VERSION:
+                cached = marshal.loads(data[len(CACHE_MAGIC) + 1:])
+                # Included files are checked by signature; a changed one means parsing again
+                if any(Preprocessor.signature(dep) != tuple(sig) for dep, sig in cached['includes']):
+                    raise ValueError(filename)
+                self.program = cached['program']
+                self.labels = cached['labels']
+                self.decoded = [(getattr(self, name), operand) for name, operand in cached['decoded']]
+                return True
+        except (OSError, ValueError, EOFError, TypeError, IndexError, KeyError, AttributeError):
+            pass  # Missing or unreadable entry: parse as usual
+
+        self.parse_program(filename)
+        root = os.path.abspath(filename)
+        cached = {
+            'includes': [(dep, sig) for dep, sig in self.preprocessor.dependencies.items() if dep != root],
+            'program': self.program,
+            'labels': self.labels,
+            'decoded': [(handler.__name__, operand) for handler, operand in self.decoded],
+        }
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp = f"{path}.{os.getpid()}.tmp"
+            with open(temp, 'wb') as f:
+                f.write(CACHE_MAGIC + bytes([CACHE_VERSION]) + marshal.dumps(cached))
+            os.replace(temp, path)
+        except OSError:
+            pass  # A read-only or full cache directory only costs the next run a parse
+        return False
+
     def parse_address(self, addr):
         """Parse an address and return it as an integer."""
         if addr.startswith('0x'):
@@ -539,59 +1378,952 @@ class SAP3Interpreter:
             # If the address is just a number (e.g., 5), return it as an integer
             return int(addr)
 
-    def execute_program(self):
-        """Execute the loaded program"""
-        self.pc = 0
-        while self.pc < len(self.program) and not self.halt:
-            line = self.program[self.pc]
-            if self.DEBUG: print(f"\nExecuting line {self.pc}: {line}")  # Add debug print here
+    # Decoders turn the text arguments of an instruction into pre-resolved operands, once, at load time
+    def decode_program(self):
+        """Decode the parsed program into (handler, operand) records for execute_program."""
+        fast = not self.DEBUG
+        memory_size = len(self.memory)
+        cache = self.decode_cache
+        decoded = []
+        for line in self.program:
+            key = (line, fast, memory_size)
+            record = cache.get(key)
+            if record is None:
+                record = self.decode_line(line, fast=fast)
+                # Label positions move whenever an earlier line changes, so only label-free records are kept
+                if ':' not in line and record[0] != self.exec_text and record[0].__name__ not in COMPILED_JUMPS:
+                    cache[key] = record
+            decoded.append(record)
+        self.decoded = decoded
+
+    def decode_line(self, line, fast=True):
+        """Decode one program line into a (handler, operand) record."""
+        # Lines that still start with a known label are skipped at run time
+        if ':' in line:
+            label = line.split(':', 1)[0].strip()
+            if label in self.labels:
+                return (self.exec_skip, None)
+
+        # Parse instruction and arguments
+        parts = line.split(None, 1)  # Split on first whitespace
+        opcode = parts[0].upper()
+        args = []
+        if len(parts) > 1 and parts[1].strip():
+            args_str = parts[1].strip()
+            if ',' in args_str:
+                args = [arg.strip() for arg in args_str.split(',')]
+            else:
+                args = [args_str.strip()]
+
+        if opcode not in self.instructions:
+            return (self.exec_unknown, opcode)
+
+        # Anything a decoder can't resolve cleanly (bad operands, missing labels, ...) runs through
+        # the original text handler, so error messages and halts happen exactly as before
+        decoder = self.decoders.get(opcode)
+        record = None
+        if decoder is not None and fast:
+            try:
+                record = decoder(args)
+            except (ValueError, IndexError):
+                record = None
+        if record is None:
+            record = (self.exec_text, (opcode, args))
+        return record
+
+    def decode_reg(self, reg):
+        """Decode 'R0'..'R15' into a register number, or raise ValueError."""
+        if not reg.startswith('R'):
+            raise ValueError(reg)
+        reg_num = int(reg[1:])
+        if reg_num < 0 or reg_num > 15:
+            raise ValueError(reg)
+        return reg_num
+
+    def decode_address(self, address):
+        """Check a decoded memory address, or raise ValueError when it is outside memory."""
+        if address < 0 or address >= len(self.memory):
+            raise ValueError(address)
+        return address
+
+    def decode_label(self, label):
+        """Resolve a label to its program index, or raise ValueError."""
+        if label not in self.labels:
+            raise ValueError(label)
+        return self.labels[label]
+
+    def decode_none(self, handler):
+        """Decoder for instructions that ignore their arguments."""
+        return lambda args: (handler, None)
+
+    def decode_mem(self, handler):
+        """Decoder for 'OP 0x50' memory instructions."""
+        return lambda args: (handler, self.decode_address(int(args[0], 16)))
+
+    def decode_jump(self, handler):
+        """Decoder for 'OP LABEL' jump instructions."""
+        return lambda args: (handler, self.decode_label(args[0]))
+
+    def decode_ldr(self, args):
+        return (self.exec_ldr, (int(args[0][1]), self.decode_address(int(args[1], 16))))
+
+    def decode_sta(self, args):
+        if len(args) != 1:
+            return None
+        return (self.exec_sta, self.decode_address(int(args[0], 16)))
 
-            # Skip label lines
-            if ':' in line:
-                label, rest = line.split(':', 1)
-                label = label.strip()
-                if label in self.labels:
-                    if self.DEBUG: print(f"Label found: {label}, skipping instruction line.")
-                    self.pc += 1
-                    continue
+    def decode_str(self, args):
+        if len(args) < 2:
+            return None
+        return (self.exec_str, (self.decode_reg('R' + args[0][1:]), self.decode_address(self.parse_address(args[1]))))
 
-            # Parse instruction and arguments
-            parts = line.split(None, 1)  # Split on first whitespace    
-            opcode = parts[0].upper()
-            args = []
+    def decode_ldri(self, args):
+        if len(args) < 2:
+            return None
+        return (self.exec_ldri, (self.decode_reg('R' + args[0][1:]), int(args[1]) & 0xFF))
 
-            if len(parts) > 1 and parts[1].strip():
-                # Process arguments    
-                args_str = parts[1].strip()
-                if ',' in args_str:
-                    args = [arg.strip() for arg in args_str.split(',')]
-                else:
-                    args = [args_str.strip()]
+    def decode_ldi(self, args):
+        if len(args) != 2:
+            return None
+        return (self.exec_ldri, (self.decode_reg('R' + args[0][1:]), int(args[1]) & 0xFF))
 
-            if self.DEBUG: print(f"Parsed opcode: {opcode}, args: {args}")  # Add debug print here
-    
-            # Handle NOTE instructions separately
-            if opcode == "NOTE":
-                # For NOTE instruction, pass the args to the note function
-                self.note(args)
-                self.pc += 1
-            elif opcode in self.instructions:
-                # Execute other instructions normally
-                if self.DEBUG: print(f"Executing instruction: {opcode} with arguments {args}")
-                pc_modified = self.instructions[opcode](args)
-                if not pc_modified:
-                    self.pc += 1
+    def decode_mov(self, args):
+        if len(args) < 2:
+            return None
+        if args[1] == 'A':
+            return (self.exec_mov_to_a, self.decode_reg(args[0]))
+        if args[0] == 'A':
+            return (self.exec_mov_from_a, self.decode_reg(args[1]))
+        return (self.exec_mov, (self.decode_reg(args[0]), self.decode_reg(args[1])))
+
+    def decode_add(self, args):
+        if len(args) != 1:
+            return None
+        if args[0].startswith('R'):
+            return (self.exec_add_reg, int(args[0][1]))
+        return (self.exec_add, self.decode_address(int(args[0], 16)))
+
+    def decode_jg(self, args):
+        return (self.exec_jmp, self.decode_label(args[0]))
+
+    def decode_jc(self, args):
+        if len(args) != 1:
+            return None
+        return (self.exec_jc, self.decode_label(args[0]))
+
+    def decode_note(self, args):
+        if len(args) < 1:
+            return None
+        message = ' '.join(args)
+        compile_note(message)  # Parse the template now rather than on the first run through
+        return (self.exec_note, message)
+
+    def decode_out(self, args):
+        if args:
+            return (self.exec_out_reg, self.decode_reg('R' + args[0][1:]))
+        return (self.exec_out, None)
+
+    # Handlers for decoded records: they take the machine state and pre-resolved operands,
+    # and return True if they set the PC
+    def exec_skip(self, st, operand):
+        return False
+
+    def exec_unknown(self, st, opcode):
+        print(f"Unknown instruction: {opcode}")
+        st.halt = True
+        return True
+
+    def exec_text(self, st, operand):
+        opcode, args = operand
+        return self.instructions[opcode](args)
+
+    def exec_ldr(self, st, operand):
+        st.registers[operand[0]] = st.memory[operand[1]]
+
+    def exec_push(self, st, operand):
+        st.memory[st.sp] = st.accumulator & 0xFF
+        st.sp -= 1
+
+    def exec_pop(self, st, operand):
+        st.sp += 1
+        st.accumulator = value = st.memory[st.sp]
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_mov_to_a(self, st, reg):
+        st.accumulator = st.registers[reg]
+
+    def exec_mov_from_a(self, st, reg):
+        st.registers[reg] = st.accumulator & 0xFF
+
+    def exec_mov(self, st, operand):
+        registers = st.registers
+        registers[operand[1]] = registers[operand[0]]
+
+    def exec_lda(self, st, address):
+        st.accumulator = value = st.memory[address]
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_sta(self, st, address):
+        st.memory[address] = st.accumulator & 0xFF
+
+    def exec_str(self, st, operand):
+        st.memory[operand[1]] = st.registers[operand[0]]
+
+    # Unchecked variants, used where SAP3Analyzer proved the accumulator already holds a byte
+    def exec_sta_byte(self, st, address):
+        st.memory[address] = st.accumulator
+
+    def exec_mov_from_a_byte(self, st, reg):
+        st.registers[reg] = st.accumulator
+
+    def exec_push_byte(self, st, operand):
+        st.memory[st.sp] = st.accumulator
+        st.sp -= 1
+
+    def exec_ldri(self, st, operand):
+        st.registers[operand[0]] = operand[1]
+
+    def exec_add_value(self, st, value):
+        value += st.accumulator
+        if value > 255:
+            value -= 255  # Wrap around the 8-bit value
+            flags = FLAG_CARRY
+        else:
+            flags = 0
+        st.accumulator = value
+        st.flags = (st.flags & ~(FLAG_CARRY | FLAG_ZERO)) | flags | (0 if value else FLAG_ZERO)
+
+    def exec_add_reg(self, st, reg):
+        self.exec_add_value(st, st.registers[reg])
+
+    def exec_add(self, st, address):
+        self.exec_add_value(st, st.memory[address])
+
+    def exec_sub(self, st, address):
+        st.accumulator = value = st.accumulator - st.memory[address]
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_and(self, st, address):
+        st.accumulator = value = st.accumulator & st.memory[address]
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_or(self, st, address):
+        st.accumulator = value = st.accumulator | st.memory[address]
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_xor(self, st, address):
+        st.accumulator = value = st.accumulator ^ st.memory[address]
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_jmp(self, st, target):
+        st.pc = target
+        return True
+
+    def exec_jz(self, st, target):
+        if st.flags & FLAG_ZERO:
+            st.pc = target
+            return True
+        return False
+
+    def exec_jnz(self, st, target):
+        if not st.flags & FLAG_ZERO:
+            st.pc = target
+            return True
+        return False
+
+    def exec_jc(self, st, target):
+        # Like jc(), execution resumes on the instruction after the label
+        if st.flags & FLAG_CARRY:
+            st.pc = target
+        else:
+            print(f"JC: No jump, Carry flag is not set.")
+        return False
+
+    def exec_jnc(self, st, target):
+        if not st.flags & FLAG_CARRY:
+            st.pc = target
+            return True
+        return False
+
+    def exec_cma(self, st, operand):
+        st.accumulator = value = ~st.accumulator & 0xFF
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_inc(self, st, operand):
+        st.accumulator = value = (st.accumulator + 1) & 0xFF
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_dec(self, st, operand):
+        st.accumulator = value = (st.accumulator - 1) & 0xFF
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_ral(self, st, operand):
+        a = st.accumulator
+        st.accumulator = value = ((a << 1) & 0xFF) | (a >> 7)
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_rar(self, st, operand):
+        a = st.accumulator
+        st.accumulator = value = (a >> 1) | ((a & 1) << 7)
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_inp(self, st, operand):
+        st.accumulator = value = self.read_input()
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_out(self, st, operand):
+        self.write_output(st.accumulator)
+
+    def exec_out_reg(self, st, reg):
+        self.write_output(st.registers[reg])
+
+    # Port access for INP and OUT: without ports, INP reads 0 and OUT prints
+    def read_input(self):
+        if self.input_port is None:
+            return 0
+        return self.input_port.read()
+
+    def write_output(self, value):
+        if self.output_port is None:
+            print(f"Output: {value}")
+        else:
+            self.output_port.write(value)
+
+    def exec_hlt(self, st, operand):
+        st.halt = True
+
+    def exec_note(self, st, message):
+        self.write_note(compile_note(message)(st))
+
+    def execute_program(self, max_steps=None, profile=False, resume=False, time_limit=None, detect_loops=False,
+                        trace=None, watchdog=None):
+        """Execute the loaded program (from the current PC if resume), stopping after max_steps instructions if given,
+        after time_limit seconds if given, or when detect_loops finds the machine in a state it has been in before.
+        With trace (a file name), one binary record per instruction is written there (see read_trace).
+        A watchdog from an earlier call can be passed instead of time_limit and detect_loops to carry on with it."""
+        if len(self.decoded) != len(self.program):
+            self.decode_program()
+        st = self.state
+        decoded = self.decoded
+        end = len(decoded)
+        limit = max_steps if max_steps is not None else sys.maxsize
+        if not resume:
+            st.pc = 0
+        reason = None
+        if watchdog is None and (time_limit is not None or detect_loops):
+            watchdog = Watchdog(time_limit, detect_loops, self.input_port)
+        if self.DEBUG or profile:
+            steps, reason = self.execute_instrumented(limit, profile, watchdog)
+        elif trace is not None:
+            with open(trace, 'wb') as f:
+                steps, reason = self.execute_traced(limit, f, watchdog)
+        elif watchdog is not None:
+            steps, reason = self.execute_guarded(limit, watchdog)
+        else:
+            steps = 0
+            # The analyzer's facts hold for runs from line 0 that start with a byte in the accumulator
+            verified = self.verified
+            if verified is not None and verified[0] is decoded and not resume and 0 <= st.accumulator <= 0xFF:
+                decoded = verified[1]
+            try:
+                while st.pc < end and not st.halt and steps < limit:
+                    handler, operand = decoded[st.pc]
+                    if not handler(st, operand):
+                        st.pc += 1
+                    steps += 1
+            except InputPending:
+                reason = 'input'  # Stopped on an INP with no value yet; resuming runs it again
+        self.finish_run(steps, end, reason)
+
+    def trace_tables(self):
+        """Opcode byte and memory-write lookup (or None) for every decoded record, for execute_traced."""
+        opcodes = []
+        writes = []
+        for handler, operand in self.decoded:
+            name = handler.__name__
+            if name in OPCODES:
+                opcodes.append(OPCODES[name][0])
             else:
-                # Handle unknown instructions
-                print(f"Unknown instruction: {opcode}")
-                self.halt = True
+                opcodes.append(TRACE_TEXT if name == 'exec_text' else TRACE_UNKNOWN)
+            target = WRITE_TARGETS.get(name)
+            writes.append(target if target is not None and target(operand, self.state)[0] == UNDO_MEMORY else None)
+        return opcodes, writes
+
+    def execute_traced(self, limit, f, watchdog=None):
+        """The execute_program loop, writing a TRACE_RECORD per instruction to the binary file f;
+        returns (steps, stop reason or None)."""
+        st = self.state
+        decoded = self.decoded
+        end = len(decoded)
+        opcodes, writes = self.trace_tables()
+        pack = TRACE_RECORD.pack_into
+        size = TRACE_RECORD.size
+        buffer = bytearray(size * TRACE_BUFFER)
+        f.write(TRACE_MAGIC + bytes([TRACE_VERSION]))
+        offset = 0
+        steps = 0
+        reason = None
+        try:
+            while st.pc < end and not st.halt and steps < limit:
+                pc = st.pc
+                handler, operand = decoded[pc]
+                write = writes[pc]
+                address = write(operand, st)[1] % len(st.memory) if write is not None else -1
+                if not handler(st, operand):
+                    st.pc += 1
+                pack(buffer, offset, steps, pc, st.accumulator, address, opcodes[pc], st.flags,
+                     st.memory[address] if address >= 0 else 0)
+                steps += 1
+                offset += size
+                if offset == len(buffer):
+                    f.write(buffer)
+                    offset = 0
+                if watchdog is not None:
+                    reason = watchdog.check(st, pc, steps)
+                    if reason is not None:
+                        break
+        finally:
+            # Keep the records up to an instruction that raised, too
+            f.write(memoryview(buffer)[:offset])
+        return steps, reason
+
+    def execute_guarded(self, limit, watchdog):
+        """The execute_program loop with a Watchdog; returns (steps, stop reason or None)."""
+        st = self.state
+        decoded = self.decoded
+        end = len(decoded)
+        repeated = watchdog.repeated if watchdog.seen is not None else None
+        steps = 0
+        while st.pc < end and not st.halt and steps < limit:
+            chunk_end = min(limit, steps + WATCHDOG_INTERVAL)
+            while st.pc < end and not st.halt and steps < chunk_end:
+                pc = st.pc
+                handler, operand = decoded[pc]
+                steps += 1
+                if not handler(st, operand):
+                    st.pc += 1
+                # Backward jump, whatever the handler returned (JC moves the PC and returns False)
+                if st.pc <= pc and repeated is not None and repeated(st):
+                    return steps, 'loop'
+            if watchdog.expired():
+                return steps, 'timeout'
+        return steps, None
+
+    def execute_instrumented(self, limit, profile, watchdog=None):
+        """The execute_program loop with DEBUG prints and per-line counts and timings, kept out of the fast loop;
+        returns (steps, stop reason or None)."""
+        st = self.state
+        decoded = self.decoded
+        end = len(decoded)
+        counts = [0] * end
+        times = [0] * end
+        clock = time.perf_counter_ns
+        steps = 0
+        reason = None
+        while st.pc < end and not st.halt and steps < limit:
+            pc = st.pc
+            if self.DEBUG: print(f"\nExecuting line {pc}: {self.program[pc]}")
+            handler, operand = decoded[pc]
+            started = clock()
+            if not handler(st, operand):
+                st.pc += 1
+            times[pc] += clock() - started
+            counts[pc] += 1
+            steps += 1
+            if watchdog is not None:
+                reason = watchdog.check(st, pc, steps)
+                if reason is not None:
+                    break
+        if profile:
+            self.profile = {'counts': counts, 'times': times}
+        return steps, reason
+
+    # Profile reports: per opcode, per label region, and per source line
+    def profile_dict(self):
+        """Summarize the last profiled run as a JSON-ready dict."""
+        counts = self.profile['counts']
+        times = self.profile['times']
+        starts = sorted((index, label) for label, index in self.labels.items())
+        opcodes = {}
+        regions = {}
+        lines = []
+        region = '(start)'
+        for pc, line in enumerate(self.program):
+            while starts and starts[0][0] <= pc:
+                region = starts.pop(0)[1]
+            if not counts[pc]:
+                continue
+            opcode = line.split(None, 1)[0].upper()
+            seconds = times[pc] / 1e9
+            for table, key in ((opcodes, opcode), (regions, region)):
+                entry = table.setdefault(key, {'count': 0, 'seconds': 0.0})
+                entry['count'] += counts[pc]
+                entry['seconds'] += seconds
+            lines.append({'line': pc, 'source': line, 'count': counts[pc], 'seconds': seconds})
+
+        def by_time(table):
+            return dict(sorted(table.items(), key=lambda item: item[1]['seconds'], reverse=True))
+
+        lines.sort(key=lambda entry: entry['seconds'], reverse=True)
+        return {
+            'steps': sum(counts),
+            'seconds': sum(times) / 1e9,
+            'opcodes': by_time(opcodes),
+            'regions': by_time(regions),
+            'lines': lines,
+        }
 
+    def profile_report(self, top=10):
+        """Format the last profiled run as a text report, hottest entries first."""
+        profile = self.profile_dict()
+        total = profile['seconds'] or 1.0
+        report = [f"Profile: {profile['steps']} instructions in {profile['seconds'] * 1000:.3f} ms"]
+        for title, table in (("Opcode", profile['opcodes']), ("Label region", profile['regions'])):
+            report.append(f"\n{title:<16} {'Count':>10} {'Time (ms)':>10} {'% Time':>7}")
+            for key, entry in table.items():
+                report.append(f"{key:<16} {entry['count']:>10} {entry['seconds'] * 1000:>10.3f} {entry['seconds'] / total:>7.1%}")
+        report.append(f"\n{'Line':<6} {'Count':>10} {'Time (ms)':>10} {'% Time':>7}  Source")
+        for entry in profile['lines'][:top]:
+            report.append(f"{entry['line']:<6} {entry['count']:>10} {entry['seconds'] * 1000:>10.3f} {entry['seconds'] / total:>7.1%}  {entry['source']}")
+        return '\n'.join(report)
+
+    def finish_run(self, steps, end, reason=None):
+        """Record how many instructions ran and why execution stopped ('halt', 'end', 'budget', or the given reason)."""
+        st = self.state
+        self.steps = steps
+        if self.output_port is not None:
+            self.output_port.flush()
+        if self.note_log is not None:
+            self.note_log.flush()
+        if reason is not None:
+            self.stop_reason = reason
+        elif st.halt:
+            self.stop_reason = 'halt'
+        elif st.pc >= end:
+            self.stop_reason = 'end'
+        else:
+            self.stop_reason = 'budget'
+
+    # Basic-block compiler: straight-line runs of decoded records become one generated function each
+    def compile_program(self):
+        """Compile the decoded program into Python functions, one per basic block."""
+        if len(self.decoded) != len(self.program):
+            self.decode_program()
+        decoded = self.decoded
+        count = len(decoded)
+        names = [handler.__name__ for handler, operand in decoded]
+        compilable = [name in COMPILED_OPS or name in COMPILED_JUMPS or name in ('exec_hlt', 'exec_note') for name in names]
+
+        # Block leaders: the first line, labels, jump targets, and the line after any jump, HLT,
+        # or instruction left to the interpreter
+        leaders = {0} | set(self.labels.values())
+        for i, (name, (handler, operand)) in enumerate(zip(names, decoded)):
+            if name in COMPILED_JUMPS:
+                leaders.update((operand, i + 1))
+            elif name == 'exec_hlt' or not compilable[i]:
+                leaders.add(i + 1)
+
+        self.blocks = [None] * count
+        namespace = {'print': print, 'note': self.exec_note, 'read_input': self.read_input, 'write_output': self.write_output}
+        source = []
+        starts = []
+        for start in sorted(leaders):
+            if start >= count or not compilable[start]:
+                continue  # Left to the interpreter
+            stop = start + 1
+            while stop < count and stop not in leaders and compilable[stop]:
+                stop += 1
+            source.append(self.compile_block(start, stop, names, decoded))
+            starts.append((start, stop - start))
+
+        code = compile('\n'.join(source), '<sap3 blocks>', 'exec')
+        exec(code, namespace)
+        for start, length in starts:
+            self.blocks[start] = (namespace[f'block_{start}'], length)
+
+    def compile_block(self, start, stop, names, decoded):
+        """Generate the source of one basic block function: block_<start>(st, budget) -> (pc, steps)."""
+        body = []
+        zero_pending = False  # True when the Zero flag still has to be set from the accumulator
+
+        def settle_zero():
+            nonlocal zero_pending
+            if zero_pending:
+                body.append(f"flags = (flags & {NOT_ZERO}) | (0 if acc else {FLAG_ZERO})")
+                zero_pending = False
+
+        def store():
+            return ["st.accumulator = acc", "st.flags = flags", "st.sp = sp"]
+
+        length = stop - start
+        last = names[stop - 1]
+        for i in range(start, stop):
+            name = names[i]
+            operand = decoded[i][1]
+            if name in COMPILED_OPS:
+                lines, effect = COMPILED_OPS[name]
+                if effect == 'acc':
+                    settle_zero()
+                body.extend(lines(operand))
+                if effect == 'zero':
+                    zero_pending = True
+            elif name == 'exec_note':
+                settle_zero()
+                body.extend(store())
+                body.append(f"note(st, {operand!r})")
+        settle_zero()
+
+        # A block that jumps back to its own start runs as a loop inside the function
+        target = decoded[stop - 1][1]
+        looping = last in COMPILED_JUMPS and last != 'exec_jc' and target == start
+        lines = [f"def block_{start}(st, budget):",
+                 "    acc = st.accumulator", "    flags = st.flags", "    sp = st.sp",
+                 "    mem = st.memory", "    regs = st.registers"]
+        if looping:
+            condition = COMPILED_JUMPS[last]
+            lines.append("    steps = 0")
+            lines.append("    while True:")
+            lines.extend("        " + line for line in body)
+            lines.append(f"        steps += {length}")
+            lines.append(f"        if not ({condition}) or steps + {length} > budget:")
+            lines.append("            break")
+            lines.extend("    " + line for line in store())
+            lines.append(f"    if {condition}:")
+            lines.append(f"        return ({start}, steps)")
+            lines.append(f"    return ({stop}, steps)")
+            return '\n'.join(lines)
+
+        lines.extend("    " + line for line in body + store())
+        if last == 'exec_hlt':
+            lines.append("    st.halt = True")
+            lines.append(f"    return ({stop}, {length})")
+        elif last == 'exec_jc':
+            # Like jc(), execution resumes on the instruction after the label
+            lines.append(f"    if {COMPILED_JUMPS[last]}:")
+            lines.append(f"        return ({target + 1}, {length})")
+            lines.append('    print("JC: No jump, Carry flag is not set.")')
+            lines.append(f"    return ({stop}, {length})")
+        elif last in COMPILED_JUMPS:
+            lines.append(f"    if {COMPILED_JUMPS[last]}:")
+            lines.append(f"        return ({target}, {length})")
+            lines.append(f"    return ({stop}, {length})")
+        else:
+            lines.append(f"    return ({stop}, {length})")
+        return '\n'.join(lines)
+
+    def execute_compiled(self, max_steps=None, resume=False):
+        """Execute the program through its compiled blocks, interpreting anything left uncompiled"""
+        if len(self.blocks) != len(self.program):
+            self.compile_program()
+        st = self.state
+        decoded = self.decoded
+        blocks = self.blocks
+        end = len(decoded)
+        limit = max_steps if max_steps is not None else sys.maxsize
+        steps = 0
+        if not resume:
+            st.pc = 0
+        while st.pc < end and not st.halt and steps < limit:
+            block = blocks[st.pc]
+            if block is not None and block[1] <= limit - steps:
+                st.pc, ran = block[0](st, limit - steps)
+                steps += ran
+            else:
+                handler, operand = decoded[st.pc]
+                if not handler(st, operand):
+                    st.pc += 1
+                steps += 1
+        self.finish_run(steps, end)
+
+    # Two-pass assembler: decoded records -> opcode bytes, jump targets resolved to byte addresses
+    def assemble(self, origin=CODE_ORIGIN):
+        """Assemble the parsed program into a binary image (header, code, NOTE strings, labels)."""
+        records = []
+        for line_num, line in enumerate(self.program):
+            handler, operand = self.decode_line(line)
+            if handler.__name__ not in OPCODES:
+                raise AssemblyError(f"Line {line_num}: can't assemble '{line}'")
+            records.append((handler.__name__, operand))
+
+        # First pass: the address of every instruction (plus the end of the code)
+        addresses = []
+        address = origin
+        for name, operand in records:
+            addresses.append(address)
+            address += 1 + OPERAND_SIZES[OPCODES[name][1]]
+        addresses.append(address)
+        if address > 0x10000:
+            raise AssemblyError(f"Program of {address - origin} bytes does not fit at origin 0x{origin:X}")
+
+        # Second pass: encode opcodes and operands
+        code = bytearray()
+        notes = []
+        for line_num, (name, operand) in enumerate(records):
+            opcode, layout = OPCODES[name]
+            code.append(opcode)
+            if layout == 'r':
+                code.append(operand)
+            elif layout == 'a':
+                code += struct.pack('<H', operand)
+            elif layout == 'ra':
+                code += struct.pack('<BH', operand[0], operand[1])
+            elif layout == 'rr':
+                code += bytes(operand)
+            elif layout == 'ri':
+                if operand[1] < -128 or operand[1] > 255:
+                    raise AssemblyError(f"Line {line_num}: immediate value {operand[1]} does not fit in a byte")
+                code += bytes((operand[0], operand[1] & 0xFF))
+            elif layout == 't':
+                # JC resumes on the instruction after its label, like the interpreter
+                target = operand + 1 if name == 'exec_jc' else operand
+                code += struct.pack('<H', addresses[min(target, len(records))])
+            elif layout == 'n':
+                code += struct.pack('<H', len(notes))
+                notes.append(operand)
+
+        # Header, code, then the NOTE string table and the label table
+        image = bytearray(IMAGE_MAGIC)
+        image += struct.pack('<BHHHH', IMAGE_VERSION, origin, len(code), len(notes), len(self.labels))
+        image += code
+        for note in notes:
+            data = note.encode('utf-8')
+            image += struct.pack('<H', len(data)) + data
+        for label, index in self.labels.items():
+            data = label.encode('utf-8')
+            image += struct.pack('<B', len(data)) + data + struct.pack('<H', addresses[index])
+        return bytes(image)
+
+    def load_image(self, image):
+        """Load a binary image into memory and build the opcode dispatch and instruction tables."""
+        if image[:4] != IMAGE_MAGIC:
+            raise AssemblyError("Not a SAP-3 image")
+        version, origin, code_len, note_count, label_count = struct.unpack_from('<BHHHH', image, 4)
+        if version != IMAGE_VERSION:
+            raise AssemblyError(f"Unsupported image version {version}")
+        offset = 4 + struct.calcsize('<BHHHH')
+        code = image[offset:offset + code_len]
+        offset += code_len
+
+        self.notes = []
+        for _ in range(note_count):
+            (length,) = struct.unpack_from('<H', image, offset)
+            self.notes.append(image[offset + 2:offset + 2 + length].decode('utf-8'))
+            offset += 2 + length
+        self.labels = {}
+        for _ in range(label_count):
+            length = image[offset]
+            label = image[offset + 1:offset + 1 + length].decode('utf-8')
+            (self.labels[label],) = struct.unpack_from('<H', image, offset + 1 + length)
+            offset += 3 + length
+
+        # Flat memory grows (in 16-byte rows) to hold the code above the data area
+        end = origin + code_len
+        if end > len(self.memory):
+            if isinstance(self.memory, PagedMemory):
+                raise AssemblyError(f"Image needs {end} bytes of memory, only {len(self.memory)} configured")
+            self.memory.extend(bytes((end + 15) // 16 * 16 - len(self.memory)))
+        self.memory[origin:end] = code
+        self.code_start = origin
+        self.code_end = end
+        self.build_dispatch()
+
+    def build_dispatch(self):
+        """Build the opcode dispatch table, then decode the loaded code into the instruction table for execute_image."""
+        # Opcode dispatch table: opcode byte -> (handler, operand fetch, instruction size)
+        notes = self.notes
+        fetchers = {
+            '': lambda m, i: None,
+            'r': lambda m, i: m[i],
+            'a': lambda m, i: m[i] | (m[i + 1] << 8),
+            'ra': lambda m, i: (m[i], m[i + 1] | (m[i + 2] << 8)),
+            'rr': lambda m, i: (m[i], m[i + 1]),
+            'ri': lambda m, i: (m[i], m[i + 1]),
+            't': lambda m, i: m[i] | (m[i + 1] << 8),
+            'n': lambda m, i: notes[m[i] | (m[i + 1] << 8)],
+        }
+        self.dispatch = [None] * 256
+        for name, (opcode, layout) in OPCODES.items():
+            handler = getattr(self, IMAGE_HANDLERS.get(name, name))
+            self.dispatch[opcode] = (handler, fetchers[layout], 1 + OPERAND_SIZES[layout])
+
+        # Instruction table: address -> (handler, operand, next PC), decoded once, in order, from the loaded code
+        self.image_table = [None] * self.code_end
+        address = self.code_start
+        while address < self.code_end:
+            entry = self.decode_at(address)
+            address = entry[2] if entry is not None else address + 1
+
+    def decode_at(self, address):
+        """Decode the instruction at address into an instruction table entry, or None for an unknown opcode."""
+        memory = self.state.memory
+        entry = self.dispatch[memory[address]]
+        if entry is None:
+            return None
+        handler, fetch, size = entry
+        try:
+            record = (handler, fetch(memory, address + 1), address + size)
+        except IndexError:
+            return None  # Operand runs off the end of memory
+        # Code is decoded as loaded; jumps outside it (into data) are decoded afresh every time
+        if address >= self.code_start:
+            self.image_table[address] = record
+        return record
+
+    def exec_push_image(self, st, operand):
+        sp = st.sp
+        if self.code_start <= sp < self.code_end:
+            raise IndexError(f"PUSH: stack pointer 0x{sp:03X} is inside the code image")
+        st.memory[sp] = st.accumulator & 0xFF
+        st.sp = sp - 1
+
+    def exec_pop_image(self, st, operand):
+        sp = st.sp + 1
+        if self.code_start <= sp < self.code_end:
+            raise IndexError(f"POP: stack pointer 0x{sp:03X} is inside the code image (empty stack)")
+        st.sp = sp
+        st.accumulator = value = st.memory[sp]
+        st.flags = (st.flags & ~FLAG_ZERO) | (0 if value else FLAG_ZERO)
+
+    def exec_jc_image(self, st, target):
+        if st.flags & FLAG_CARRY:
+            st.pc = target
+            return True
+        print(f"JC: No jump, Carry flag is not set.")
+        return False
+
+    def execute_image(self, max_steps=None, resume=False, time_limit=None, detect_loops=False, watchdog=None):
+        """Fetch, decode and execute the image loaded into memory, stopping after max_steps if given,
+        or on time_limit and detect_loops as in execute_program."""
+        st = self.state
+        table = self.image_table
+        end = self.code_end
+        limit = max_steps if max_steps is not None else sys.maxsize
+        if watchdog is None and (time_limit is not None or detect_loops):
+            watchdog = Watchdog(time_limit, detect_loops, self.input_port)
+        steps = 0
+        if not resume:
+            st.pc = self.code_start
+        if self.DEBUG or watchdog is not None:
+            return self.execute_image_checked(limit, watchdog)
+        # The PC lives in a local; handlers that jump set st.pc and return True
+        pc = st.pc
+        try:
+            while pc < end and not st.halt and steps < limit:
+                entry = table[pc] or self.decode_at(pc)
+                if entry is None:
+                    print(f"Unknown opcode 0x{st.memory[pc]:02X} at address 0x{pc:03X}")
+                    st.halt = True
+                    break
+                handler, operand, next_pc = entry
+                pc = st.pc if handler(st, operand) else next_pc
+                steps += 1
+        finally:
+            st.pc = pc  # An instruction that raised is left at the PC
+        self.finish_run(steps, end)
+
+    def execute_image_checked(self, limit, watchdog):
+        """The execute_image loop with DEBUG prints and the watchdog, kept out of the fast loop."""
+        st = self.state
+        table = self.image_table
+        end = self.code_end
+        steps = 0
+        reason = None
+        while st.pc < end and not st.halt and steps < limit:
+            pc = st.pc
+            entry = table[pc] or self.decode_at(pc)
+            if entry is None:
+                print(f"Unknown opcode 0x{st.memory[pc]:02X} at address 0x{pc:03X}")
+                st.halt = True
+                break
+            handler, operand, next_pc = entry
+            if self.DEBUG: print(f"\nExecuting 0x{pc:03X}: opcode 0x{st.memory[pc]:02X} ({handler.__name__})")
+            if not handler(st, operand):
+                st.pc = next_pc
+            steps += 1
+            if watchdog is not None:
+                reason = watchdog.check(st, pc, steps)
+                if reason is not None:
+                    break
+        self.finish_run(steps, end, reason)
+
+    # Snapshots: full machine state plus the loaded program, so runs can be resumed or forked
+    def snapshot(self):
+        """Return the machine state, labels, and decoded program as compact snapshot bytes."""
+        meta = {
+            'program': self.program,
+            'labels': self.labels,
+            'decoded': [(handler.__name__, operand) for handler, operand in self.decoded],
+            'steps': self.steps,
+            'image': None,
+        }
+        if self.code_start is not None:
+            meta['image'] = {'start': self.code_start, 'end': self.code_end, 'notes': self.notes}
+        state = self.state.snapshot()
+        packed = zlib.compress(json.dumps(meta, separators=(',', ':')).encode('utf-8'))
+        return b''.join((SNAPSHOT_MAGIC, struct.pack('<BII', SNAPSHOT_VERSION, len(state), len(packed)), state, packed))
+
+    def restore(self, data):
+        """Restore the machine from snapshot() bytes; continue with execute_*(resume=True)."""
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError("Not a SAP-3 snapshot")
+        offset = len(SNAPSHOT_MAGIC)
+        version, state_len, meta_len = struct.unpack_from('<BII', data, offset)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        offset += struct.calcsize('<BII')
+        state = data[offset:offset + state_len]
+        meta = json.loads(zlib.decompress(data[offset + state_len:offset + state_len + meta_len]))
+
+        # Memory may have grown (images) or be paged; the state takes the saved memory as it is
+        self.state.restore(state)
+
+        self.program = meta['program']
+        self.labels = meta['labels']
+        self.decoded = [(getattr(self, name), tuple(operand) if isinstance(operand, list) else operand)
+                        for name, operand in meta['decoded']]
+        self.blocks = []
+        self.steps = meta['steps']
+        image = meta['image']
+        if image is not None:
+            self.code_start, self.code_end, self.notes = image['start'], image['end'], image['notes']
+            self.build_dispatch()
+
+    @classmethod
+    def from_snapshot(cls, data):
+        """Create a new interpreter from snapshot() bytes, e.g. to fork many runs from one state."""
+        interpreter = cls()
+        interpreter.restore(data)
+        return interpreter
+
+    def write_snapshot(self, filename):
+        """Write a snapshot to a file, replacing any previous one atomically."""
+        temp = filename + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(self.snapshot())
+        os.replace(temp, filename)
+
+    def execute_checkpointed(self, filename, every, max_steps=None, resume=False, time_limit=None, detect_loops=False):
+        """Execute the program (or the loaded image), writing a snapshot to filename every `every` instructions.
+        time_limit and detect_loops cover the whole run, as in execute_program."""
+        limit = max_steps if max_steps is not None else sys.maxsize
+        total = self.steps if resume else 0
+        watchdog = Watchdog(time_limit, detect_loops, self.input_port) if time_limit is not None or detect_loops else None
+        run = self.execute_image if self.code_start is not None else self.execute_program
+        while True:
+            run(max_steps=min(every, limit - total), resume=resume, watchdog=watchdog)
+            total += self.steps
+            self.steps = total
+            if self.stop_reason != 'budget' or total >= limit:
+                break
+            self.write_snapshot(filename)
+            resume = True
+        self.write_snapshot(filename)
 
     def display_state(self):
         """Display the current state of the interpreter"""
         print(f"\nAccumulator: {self.accumulator} (0x{self.accumulator:02X})")
         print(f"PC: {self.pc}, SP: {self.sp}")
-        print(f"Flags - Zero: {self.flags['Zero']}, Carry: {self.flags['Carry']}")  # Fixed here
+        print(f"Flags - Zero: {self.zero_flag}, Carry: {self.carry_flag}")
 
         print("\nRegisters:")
         # Loop over the range of 4 columns
@@ -601,35 +2333,1237 @@ class SAP3Interpreter:
                 print(f"R{j:02}: {self.registers[j]:3}  (0x{self.registers[j]:02X})", end="  ")
             print()  # New line after each row of 4 registers
 
+        if isinstance(self.memory, PagedMemory) and self.memory.banks > 1:
+            print(f"\nBank {self.memory.bank} of {self.memory.banks} at 0x{self.memory.window_start:04X}")
+
         print("\nMemory (non-zero values):")
-        for i in range(0, 512, 16):
-            row_has_data = any(self.memory[i + j] != 0 for j in range(16))
-            if row_has_data:
-                print(f"{i:03X}:", end=" ")
-                for j in range(16):
-                    print(f"{self.memory[i + j]:02X}", end=" ")
-                print()
-        print()
+        print(''.join(f"{i:03X}: {row.hex(' ').upper()} \n" for i, row in memory_rows(self.memory)))
+
+    def disassembly(self, start=None, end=None):
+        """Disassemble the loaded image as text lines; without an image, the program is assembled first."""
+        if self.code_start is None:
+            image = SAP3Interpreter()
+            image.load_image(self.assemble())
+            return image.disassembly(start, end)
+        start = self.code_start if start is None else max(start, self.code_start)
+        end = self.code_end if end is None else min(end, self.code_end)
+        return disassemble(self.memory, start, end, self.labels, self.notes)
+
+    def state_dict(self):
+        """Return the display_state information as a JSON-ready dict."""
+        st = self.state
+        memory = {f"{i:03X}": list(row) for i, row in memory_rows(st.memory)}
+        return {
+            'accumulator': st.accumulator,
+            'pc': st.pc,
+            'sp': st.sp,
+            'flags': {'zero': self.zero_flag, 'carry': self.carry_flag},
+            'registers': list(st.registers),
+            'memory': memory,
+        }
 
-def main():
-    import sys
+# Time-travel debugger: one fixed-size undo record per step in a ring buffer
+#   pc, accumulator, sp, flags, halt, write kind, write index, old value
+UNDO_RECORD = struct.Struct('<iiiBBBIB')
+UNDO_NONE, UNDO_MEMORY, UNDO_REGISTER, UNDO_STATE = range(4)
+
+# The one memory or register byte each decoded handler overwrites
+WRITE_TARGETS = {
+    'exec_sta':        lambda op, st: (UNDO_MEMORY, op),
+    'exec_str':        lambda op, st: (UNDO_MEMORY, op[1]),
+    'exec_push':       lambda op, st: (UNDO_MEMORY, st.sp),
+    'exec_ldr':        lambda op, st: (UNDO_REGISTER, op[0]),
+    'exec_ldri':       lambda op, st: (UNDO_REGISTER, op[0]),
+    'exec_mov':        lambda op, st: (UNDO_REGISTER, op[1]),
+    'exec_mov_from_a': lambda op, st: (UNDO_REGISTER, op),
+    'exec_text':       lambda op, st: (UNDO_STATE, 0),  # Text handlers may write anything
+}
+
+
+class SAP3Debugger:
+    """Step and reverse-step through a parsed program, keeping a bounded undo log."""
+
+    def __init__(self, interpreter, history=100_000):
+        self.interpreter = interpreter
+        if len(interpreter.decoded) != len(interpreter.program):
+            interpreter.decode_program()
+        self.history = history
+        self.log = bytearray(UNDO_RECORD.size * history)
+        self.saved_states = {}  # Ring slot -> full state snapshot, for instructions run as text
+        self.head = 0  # Next ring slot to write
+        self.count = 0  # Records held, at most history
+        self.steps = 0
+        self.breakpoints = set()
+
+    def step(self):
+        """Execute one instruction, logging how to undo it. Returns False once the program has stopped."""
+        interpreter = self.interpreter
+        st = interpreter.state
+        if st.halt or st.pc >= len(interpreter.decoded):
+            return False
+        handler, operand = interpreter.decoded[st.pc]
+        target = WRITE_TARGETS.get(handler.__name__)
+        kind, index = target(operand, st) if target else (UNDO_NONE, 0)
+        if kind == UNDO_MEMORY:
+            index %= len(st.memory)  # A negative SP writes from the top of memory; the log stores the real address
+        old = st.memory[index] if kind == UNDO_MEMORY else st.registers[index] if kind == UNDO_REGISTER else 0
+        UNDO_RECORD.pack_into(self.log, self.head * UNDO_RECORD.size,
+                              st.pc, st.accumulator, st.sp, st.flags, st.halt, kind, index, old)
+        if kind == UNDO_STATE:
+            self.saved_states[self.head] = st.snapshot()
+        else:
+            self.saved_states.pop(self.head, None)
+        self.head = (self.head + 1) % self.history
+        self.count = min(self.count + 1, self.history)
 
-    if len(sys.argv) != 2:
-        print("Usage: python sap3_interpreter.py <asm_file>")
-        return
+        if not handler(st, operand):
+            st.pc += 1
+        self.steps += 1
+        return True
+
+    def back(self):
+        """Undo the last instruction. Returns False when the log is empty."""
+        if not self.count:
+            return False
+        self.head = (self.head - 1) % self.history
+        self.count -= 1
+        st = self.interpreter.state
+        pc, accumulator, sp, flags, halt, kind, index, old = UNDO_RECORD.unpack_from(self.log, self.head * UNDO_RECORD.size)
+        if kind == UNDO_STATE:
+            st.restore(self.saved_states.pop(self.head))
+        else:
+            st.pc, st.accumulator, st.sp, st.flags, st.halt = pc, accumulator, sp, flags, bool(halt)
+            if kind == UNDO_MEMORY:
+                st.memory[index] = old
+            elif kind == UNDO_REGISTER:
+                st.registers[index] = old
+        self.steps -= 1
+        return True
+
+    def run(self):
+        """Step until a breakpoint, HLT, or the end of the program."""
+        while self.step():
+            if self.interpreter.state.pc in self.breakpoints:
+                break
+
+    def reverse_run(self):
+        """Step backward until a breakpoint or the oldest logged instruction."""
+        while self.back():
+            if self.interpreter.state.pc in self.breakpoints:
+                break
+
+    def resolve(self, where):
+        """Turn a label or line number into a program line."""
+        if where in self.interpreter.labels:
+            return self.interpreter.labels[where]
+        return int(where)
+
+    def where(self):
+        """Describe the current position: step count, line, and source."""
+        interpreter = self.interpreter
+        pc = interpreter.state.pc
+        line = interpreter.program[pc] if pc < len(interpreter.program) else "(end of program)"
+        return f"[step {self.steps}, {self.count} undoable] line {pc}: {line}"
+
+    def interact(self):
+        """Simple command loop: s/b [n] step/back, c/rc run forward/backward, p state, q quit."""
+        commands = {
+            's': "s [n]      step forward n instructions",
+            'b': "b [n]      step backward n instructions",
+            'c': "c          continue to a breakpoint or halt",
+            'rc': "rc         reverse-continue to a breakpoint or the oldest logged step",
+            'br': "br <where> set a breakpoint at a label or line number",
+            'd': "d <where>  delete a breakpoint",
+            'p': "p          print the machine state",
+            'q': "q          quit",
+        }
+        print(self.where())
+        while True:
+            try:
+                words = input("(sap3) ").split()
+            except EOFError:
+                break
+            if not words:
+                continue
+            command, args = words[0], words[1:]
+            try:
+                if command == 's':
+                    for _ in range(int(args[0]) if args else 1):
+                        if not self.step():
+                            break
+                elif command == 'b':
+                    for _ in range(int(args[0]) if args else 1):
+                        if not self.back():
+                            break
+                elif command == 'c':
+                    self.run()
+                elif command == 'rc':
+                    self.reverse_run()
+                elif command == 'br':
+                    self.breakpoints.add(self.resolve(args[0]))
+                elif command == 'd':
+                    self.breakpoints.discard(self.resolve(args[0]))
+                elif command == 'p':
+                    self.interpreter.display_state()
+                elif command == 'q':
+                    break
+                else:
+                    print('\n'.join(commands.values()))
+                    continue
+            except (ValueError, IndexError):
+                print(f"Error: bad arguments for '{command}'")
+                continue
+            print(self.where())
+
+
+# Async machines: many interpreters share one event loop, each running a slice of instructions at a time
+DEFAULT_SLICE = 10_000  # Instructions between yields to the event loop
+
+
+class SAP3Machine:
+    """An interpreter driven from asyncio: run() executes slice_steps instructions at a time, yielding to the event loop
+    between slices and awaiting input when INP finds none. Feed INP with feed(); OUT values arrive on outputs().
+    """
+
+    def __init__(self, interpreter, slice_steps=DEFAULT_SLICE):
+        self.interpreter = interpreter
+        self.slice_steps = slice_steps
+        self.input = interpreter.input_port = AsyncInputPort()
+        interpreter.output_port = OutputPort(self.put_output)
+        self.output = asyncio.Queue()
+        self.steps = 0
+
+    @classmethod
+    def from_file(cls, filename, slice_steps=DEFAULT_SLICE):
+        interpreter = SAP3Interpreter()
+        interpreter.load_program(filename)
+        return cls(interpreter, slice_steps)
+
+    def feed(self, *values):
+        """Queue values for INP."""
+        self.input.feed(*values)
+
+    def close_input(self):
+        """No more input: INP reads 0 from now on instead of waiting."""
+        self.input.close()
+
+    def put_output(self, values):
+        for value in values:
+            self.output.put_nowait(value)
+
+    async def outputs(self):
+        """Yield OUT values as the machine produces them, until it stops."""
+        while (value := await self.output.get()) is not None:
+            yield value
+
+    async def run(self, max_steps=None, resume=False):
+        """Run until the program stops or max_steps instructions have run; return the stop reason."""
+        interpreter = self.interpreter
+        limit = max_steps if max_steps is not None else sys.maxsize
+        while True:
+            interpreter.execute_program(max_steps=min(self.slice_steps, limit - self.steps), resume=resume)
+            resume = True
+            self.steps += interpreter.steps
+            reason = interpreter.stop_reason
+            if reason == 'input':
+                await self.input.wait()
+            elif reason == 'budget' and self.steps < limit:
+                await asyncio.sleep(0)  # Let the other machines have a turn
+            else:
+                break
+        interpreter.steps = self.steps
+        self.output.put_nowait(None)  # Ends outputs()
+        return reason
+
+
+async def run_machines(machines, max_steps=None):
+    """Run many machines concurrently in the current event loop and return their stop reasons in order."""
+    return await asyncio.gather(*(machine.run(max_steps) for machine in machines))
+
+
+# Lanes: one program, many machine states, stepped together as rows of NumPy arrays
+class SAP3Lanes:
+    """Runs an interpreter's decoded program on many machine states at once.
+
+    Every step runs the instruction at the lowest PC among the running lanes, for all lanes at
+    that PC. Lanes that branch apart are masked off and join up again when their PCs meet.
+    NOTE is skipped, INP reads 0, and OUT values are collected per lane in self.outputs.
+    """
+
+    def __init__(self, interpreter, lanes):
+        """Start `lanes` copies of the interpreter's current state; set up different states through the arrays."""
+        if np is None:
+            raise ImportError("SAP3Lanes needs NumPy")
+        if not isinstance(interpreter.memory, bytearray):
+            raise ValueError("SAP3Lanes needs flat memory (512 bytes, no banks)")
+        if len(interpreter.decoded) != len(interpreter.program):
+            interpreter.decode_program()
+        self.interpreter = interpreter
+        st = interpreter.state
+        self.memory = np.tile(np.frombuffer(st.memory, dtype=np.uint8), (lanes, 1))
+        self.registers = np.tile(np.frombuffer(st.registers, dtype=np.uint8), (lanes, 1))
+        self.accumulator = np.full(lanes, st.accumulator, dtype=np.int64)
+        self.flags = np.full(lanes, st.flags, dtype=np.uint8)
+        self.pc = np.full(lanes, st.pc, dtype=np.int64)
+        self.sp = np.full(lanes, st.sp, dtype=np.int64)
+        self.halt = np.full(lanes, st.halt, dtype=bool)
+        self.steps = np.zeros(lanes, dtype=np.int64)
+        self.outputs = [[] for _ in range(lanes)]
+        self.errors = {}  # lane -> error that stopped it
+        # Vectorized op per decoded record; anything without one runs lane by lane on the interpreter
+        self.ops = []
+        for handler, operand in interpreter.decoded:
+            op = getattr(self, 'lane_' + handler.__name__[len('exec_'):], None)
+            self.ops.append((op, operand) if op is not None else (self.lane_fallback, (handler, operand)))
+
+    @classmethod
+    def from_states(cls, interpreter, states):
+        """Create lanes from a list of SAP3State objects."""
+        lanes = cls(interpreter, len(states))
+        for lane, st in enumerate(states):
+            lanes.store_state(lane, st)
+        return lanes
+
+    def state(self, lane):
+        """Return one lane as a SAP3State."""
+        st = SAP3State(self.memory.shape[1])
+        st.memory[:] = self.memory[lane].tobytes()
+        st.registers[:] = self.registers[lane].tobytes()
+        st.accumulator = int(self.accumulator[lane])
+        st.flags = int(self.flags[lane])
+        st.pc = int(self.pc[lane])
+        st.sp = int(self.sp[lane])
+        st.halt = bool(self.halt[lane])
+        return st
+
+    def store_state(self, lane, st):
+        """Copy a SAP3State into one lane."""
+        self.memory[lane] = np.frombuffer(st.memory, dtype=np.uint8)
+        self.registers[lane] = np.frombuffer(st.registers, dtype=np.uint8)
+        self.accumulator[lane] = st.accumulator
+        self.flags[lane] = st.flags
+        self.pc[lane] = st.pc
+        self.sp[lane] = st.sp
+        self.halt[lane] = st.halt
+
+    def run(self, max_steps=None):
+        """Run every lane until it halts, runs off the end, fails, or has run max_steps instructions."""
+        ops = self.ops
+        end = len(ops)
+        limit = max_steps if max_steps is not None else sys.maxsize
+        pc, halt, steps = self.pc, self.halt, self.steps
+        while True:
+            running = ~halt & (pc < end) & (steps < limit)
+            if not running.any():
+                break
+            current = pc[running].min()
+            lanes = np.flatnonzero(running & (pc == current))
+            steps[lanes] += 1
+            op, operand = ops[current]
+            if not op(lanes, operand):
+                pc[lanes] += 1
+        return self.stop_reasons()
+
+    def stop_reasons(self):
+        """Why each lane stopped: 'halt', 'end', 'budget' or 'error' (see self.errors)."""
+        end = len(self.ops)
+        reasons = []
+        for lane in range(len(self.pc)):
+            if lane in self.errors:
+                reasons.append('error')
+            elif self.halt[lane]:
+                reasons.append('halt')
+            elif self.pc[lane] >= end:
+                reasons.append('end')
+            else:
+                reasons.append('budget')
+        return reasons
+
+    def fail(self, lanes, message):
+        """Stop lanes whose instruction raised, as the scalar interpreter would have."""
+        for lane in lanes.tolist():
+            self.errors[lane] = message
+        self.halt[lanes] = True
+
+    def set_zero(self, lanes, value):
+        self.flags[lanes] = (self.flags[lanes] & NOT_ZERO) | np.where(value == 0, FLAG_ZERO, 0)
+
+    def lane_fallback(self, lanes, record):
+        """Run a record the lanes can't vectorize through the interpreter, one lane at a time."""
+        handler, operand = record
+        interpreter = self.interpreter
+        saved = interpreter.state
+        try:
+            for lane in lanes.tolist():
+                st = interpreter.state = self.state(lane)
+                try:
+                    if not handler(st, operand):
+                        st.pc += 1
+                except Exception as e:
+                    self.errors[lane] = f"{type(e).__name__}: {e}"
+                    st.halt = True
+                self.store_state(lane, st)
+        finally:
+            interpreter.state = saved
+        return True
+
+    # Vectorized handlers: same effects as the exec_* handlers, for every lane in `lanes`
+    def lane_skip(self, lanes, operand):
+        return False
+
+    lane_note = lane_skip
 
+    def lane_hlt(self, lanes, operand):
+        self.halt[lanes] = True
+
+    def lane_lda(self, lanes, address):
+        self.accumulator[lanes] = value = self.memory[lanes, address]
+        self.set_zero(lanes, value)
+
+    def lane_sta(self, lanes, address):
+        self.memory[lanes, address] = self.accumulator[lanes] & 0xFF
+
+    def lane_ldr(self, lanes, operand):
+        self.registers[lanes, operand[0]] = self.memory[lanes, operand[1]]
+
+    def lane_str(self, lanes, operand):
+        self.memory[lanes, operand[1]] = self.registers[lanes, operand[0]]
+
+    def lane_ldri(self, lanes, operand):
+        self.registers[lanes, operand[0]] = operand[1]
+
+    def lane_mov(self, lanes, operand):
+        self.registers[lanes, operand[1]] = self.registers[lanes, operand[0]]
+
+    def lane_mov_to_a(self, lanes, reg):
+        self.accumulator[lanes] = self.registers[lanes, reg]
+
+    def lane_mov_from_a(self, lanes, reg):
+        self.registers[lanes, reg] = self.accumulator[lanes] & 0xFF
+
+    def lane_add_value(self, lanes, value):
+        value = value + self.accumulator[lanes]
+        carry = value > 255
+        value = np.where(carry, value - 255, value)  # Wrap around the 8-bit value
+        self.accumulator[lanes] = value
+        flags = self.flags[lanes] & (NOT_CARRY & NOT_ZERO)
+        self.flags[lanes] = flags | np.where(carry, FLAG_CARRY, 0) | np.where(value == 0, FLAG_ZERO, 0)
+
+    def lane_add(self, lanes, address):
+        self.lane_add_value(lanes, self.memory[lanes, address].astype(np.int64))
+
+    def lane_add_reg(self, lanes, reg):
+        self.lane_add_value(lanes, self.registers[lanes, reg].astype(np.int64))
+
+    def lane_sub(self, lanes, address):
+        self.accumulator[lanes] = value = self.accumulator[lanes] - self.memory[lanes, address]
+        self.set_zero(lanes, value)
+
+    def lane_and(self, lanes, address):
+        self.accumulator[lanes] = value = self.accumulator[lanes] & self.memory[lanes, address]
+        self.set_zero(lanes, value)
+
+    def lane_or(self, lanes, address):
+        self.accumulator[lanes] = value = self.accumulator[lanes] | self.memory[lanes, address]
+        self.set_zero(lanes, value)
+
+    def lane_xor(self, lanes, address):
+        self.accumulator[lanes] = value = self.accumulator[lanes] ^ self.memory[lanes, address]
+        self.set_zero(lanes, value)
+
+    def lane_jmp(self, lanes, target):
+        self.pc[lanes] = target
+        return True
+
+    def lane_jump_if(self, lanes, target, taken):
+        self.pc[lanes] = np.where(taken, target, self.pc[lanes] + 1)
+        return True
+
+    def lane_jz(self, lanes, target):
+        return self.lane_jump_if(lanes, target, (self.flags[lanes] & FLAG_ZERO) != 0)
+
+    def lane_jnz(self, lanes, target):
+        return self.lane_jump_if(lanes, target, (self.flags[lanes] & FLAG_ZERO) == 0)
+
+    def lane_jc(self, lanes, target):
+        # Like exec_jc, execution resumes on the instruction after the label
+        return self.lane_jump_if(lanes, target + 1, (self.flags[lanes] & FLAG_CARRY) != 0)
+
+    def lane_jnc(self, lanes, target):
+        return self.lane_jump_if(lanes, target, (self.flags[lanes] & FLAG_CARRY) == 0)
+
+    def lane_cma(self, lanes, operand):
+        self.accumulator[lanes] = value = ~self.accumulator[lanes] & 0xFF
+        self.set_zero(lanes, value)
+
+    def lane_inc(self, lanes, operand):
+        self.accumulator[lanes] = value = (self.accumulator[lanes] + 1) & 0xFF
+        self.set_zero(lanes, value)
+
+    def lane_dec(self, lanes, operand):
+        self.accumulator[lanes] = value = (self.accumulator[lanes] - 1) & 0xFF
+        self.set_zero(lanes, value)
+
+    def lane_ral(self, lanes, operand):
+        a = self.accumulator[lanes]
+        self.accumulator[lanes] = value = ((a << 1) & 0xFF) | (a >> 7)
+        self.set_zero(lanes, value)
+
+    def lane_rar(self, lanes, operand):
+        a = self.accumulator[lanes]
+        self.accumulator[lanes] = value = (a >> 1) | ((a & 1) << 7)
+        self.set_zero(lanes, value)
+
+    def lane_inp(self, lanes, operand):
+        self.accumulator[lanes] = 0
+        self.flags[lanes] |= FLAG_ZERO
+
+    def lane_out(self, lanes, operand):
+        for lane, value in zip(lanes.tolist(), self.accumulator[lanes].tolist()):
+            self.outputs[lane].append(value)
+
+    def lane_out_reg(self, lanes, reg):
+        for lane, value in zip(lanes.tolist(), self.registers[lanes, reg].tolist()):
+            self.outputs[lane].append(value)
+
+    def stack_lanes(self, lanes, sp):
+        """Split off lanes whose stack pointer is outside memory; they fail like the scalar IndexError."""
+        size = self.memory.shape[1]
+        bad = (sp < -size) | (sp >= size)
+        if bad.any():
+            self.fail(lanes[bad], "IndexError: bytearray index out of range")
+            lanes, sp = lanes[~bad], sp[~bad]
+        return lanes, sp
+
+    def lane_push(self, lanes, operand):
+        lanes, sp = self.stack_lanes(lanes, self.sp[lanes])
+        self.memory[lanes, sp] = self.accumulator[lanes] & 0xFF
+        self.sp[lanes] = sp - 1
+        self.pc[lanes] += 1
+        return True
+
+    def lane_pop(self, lanes, operand):
+        lanes, sp = self.stack_lanes(lanes, self.sp[lanes] + 1)
+        self.sp[lanes] = sp
+        self.accumulator[lanes] = value = self.memory[lanes, sp]
+        self.set_zero(lanes, value)
+        self.pc[lanes] += 1
+        return True
+
+
+# Static analysis: what each decoded handler reads, writes, and does to the accumulator
+MEMORY_READS = {
+    'exec_lda': lambda op: op,
+    'exec_add': lambda op: op,
+    'exec_sub': lambda op: op,
+    'exec_and': lambda op: op,
+    'exec_or':  lambda op: op,
+    'exec_xor': lambda op: op,
+    'exec_ldr': lambda op: op[1],
+}
+MEMORY_WRITES = {
+    'exec_sta': lambda op: op,
+    'exec_str': lambda op: op[1],
+}
+# Handlers that leave a byte (0-255) in the accumulator whatever it held, and those that keep one a byte;
+# anything else (SUB, text handlers) may leave it outside 0-255
+ACC_BYTE = {'exec_lda', 'exec_pop', 'exec_and', 'exec_cma', 'exec_inc', 'exec_dec', 'exec_inp', 'exec_mov_to_a'}
+ACC_KEEPS_BYTE = {'exec_skip', 'exec_sta', 'exec_str', 'exec_ldr', 'exec_ldri', 'exec_mov', 'exec_mov_from_a',
+                  'exec_add', 'exec_add_reg', 'exec_or', 'exec_xor', 'exec_ral', 'exec_rar', 'exec_push',
+                  'exec_out', 'exec_out_reg', 'exec_note', 'exec_hlt', 'exec_jmp', 'exec_jz', 'exec_jnz',
+                  'exec_jc', 'exec_jnc'}
+# Handlers with an unchecked variant once the accumulator is known to be a byte
+UNCHECKED = {'exec_sta': 'exec_sta_byte', 'exec_mov_from_a': 'exec_mov_from_a_byte', 'exec_push': 'exec_push_byte'}
+JUMP_OPCODES = ('JMP', 'JG', 'JZ', 'JNZ', 'JC', 'JNC')
+
+
+class SAP3Analyzer:
+    """Checks a parsed program without running it.
+
+    Builds a control-flow graph from the jumps and reports unknown instructions, undefined labels,
+    invalid operands, unreachable code, and memory read before anything writes it. apply() hands
+    what it proved to execute_program, which can then skip the byte masking in STA, PUSH and MOV R, A.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        if len(interpreter.decoded) != len(interpreter.program):
+            interpreter.decode_program()
+        self.issues = []  # (line, 'error' or 'warning', message)
+        self.successors = [self.line_successors(pc) for pc in range(len(interpreter.decoded))]
+        self.check_operands()
+        self.build_blocks()
+        self.flow()
+
+    def line_successors(self, pc):
+        """Lines that can run after line pc (lines past the end are left out)."""
+        interpreter = self.interpreter
+        handler, operand = interpreter.decoded[pc]
+        name = handler.__name__
+        if name == 'exec_jmp':
+            targets = [operand]
+        elif name in ('exec_jz', 'exec_jnz', 'exec_jnc'):
+            targets = [operand, pc + 1]
+        elif name == 'exec_jc':
+            targets = [operand + 1, pc + 1]  # JC resumes after the label
+        elif name in ('exec_hlt', 'exec_unknown'):
+            targets = []
+        elif name == 'exec_text' and operand[0] in JUMP_OPCODES:
+            # Jumps to missing labels halt; conditional ones may also fall through
+            opcode, args = operand
+            targets = [] if opcode in ('JMP', 'JG') else [pc + 1]
+            if args and args[0] in interpreter.labels:
+                targets.append(interpreter.labels[args[0]] + (opcode == 'JC'))
+        else:
+            targets = [pc + 1]
+        return [target for target in targets if target < len(interpreter.decoded)]
+
+    def check_operands(self):
+        """Report lines the decoder couldn't resolve, saying why, and register operands read by their first digit."""
+        interpreter = self.interpreter
+        for pc, (handler, operand) in enumerate(interpreter.decoded):
+            line = interpreter.program[pc]
+            name = handler.__name__
+            if name == 'exec_unknown':
+                self.issues.append((pc, 'error', f"unknown instruction {operand} in '{line}'"))
+            elif name == 'exec_text':
+                self.issues.append((pc, 'error', f"{self.diagnose(*operand)} in '{line}'"))
+            elif name in ('exec_ldr', 'exec_add_reg'):
+                reg = line.split(None, 1)[1].split(',')[0].strip()
+                try:
+                    interpreter.decode_reg(reg)
+                except ValueError:
+                    self.issues.append((pc, 'warning', f"register {reg} is out of range, R{reg[1]} is used in '{line}'"))
+
+    def diagnose(self, opcode, args):
+        """Explain why a line runs through the text handlers."""
+        interpreter = self.interpreter
+        if opcode in JUMP_OPCODES:
+            if not args:
+                return "missing label"
+            if args[0] not in interpreter.labels:
+                return f"undefined label {args[0]}"
+        decoder = interpreter.decoders.get(opcode)
+        if decoder is None:
+            return "not decoded"
+        try:
+            record = decoder(args)
+        except IndexError:
+            return "missing operand"
+        except ValueError as e:
+            value = e.args[0] if e.args else ''
+            if isinstance(value, int):
+                return f"address 0x{value:X} is outside memory"
+            if isinstance(value, str) and value.startswith('R'):
+                return f"invalid register {value}"
+            if isinstance(value, str) and value.startswith('invalid literal'):
+                return f"invalid number {value.rsplit(': ', 1)[-1]}"
+            return f"invalid operand {value}"
+        return "wrong number of operands" if record is None else "not decoded"
+
+    def build_blocks(self):
+        """Split the program into basic blocks: self.blocks maps a block's first line to (end line, successor blocks)."""
+        count = len(self.successors)
+        leaders = {0} if count else set()
+        for pc, targets in enumerate(self.successors):
+            if targets != [pc + 1]:
+                leaders.update(targets)
+                leaders.add(pc + 1)
+        leaders = sorted(leader for leader in leaders if leader < count)
+        self.blocks = {}
+        for start, stop in zip(leaders, leaders[1:] + [count]):
+            self.blocks[start] = (stop, self.successors[stop - 1])
+
+    def flow(self):
+        """Find reachable lines, memory possibly read before written, and lines where the accumulator is a byte."""
+        interpreter = self.interpreter
+        decoded = interpreter.decoded
+        names = [handler.__name__ for handler, operand in decoded]
+        # Per line on entry: memory addresses written on every path (None: unknown, a text handler ran),
+        # and whether the accumulator is a byte on every path
+        entry = {}
+        if decoded:
+            entry[0] = (frozenset(), True)
+        pending = [0] if decoded else []
+        while pending:
+            pc = pending.pop()
+            written, acc_byte = entry[pc]
+            name = names[pc]
+            operand = decoded[pc][1]
+            if name == 'exec_text':
+                written = None
+            elif name in MEMORY_WRITES and written is not None:
+                written = written | {MEMORY_WRITES[name](operand)}
+            acc_byte = name in ACC_BYTE or (acc_byte and name in ACC_KEEPS_BYTE)
+            for target in self.successors[pc]:
+                old = entry.get(target)
+                if old is None:
+                    new = (written, acc_byte)
+                else:
+                    merged = old[0] if written is None else written if old[0] is None else old[0] & written
+                    new = (merged, old[1] and acc_byte)
+                if new != old:
+                    entry[target] = new
+                    pending.append(target)
+
+        self.reachable = set(entry)
+        self.byte_lines = {pc for pc, (written, acc_byte) in entry.items() if acc_byte}
+        for pc in sorted(entry):
+            written = entry[pc][0]
+            read = MEMORY_READS.get(names[pc])
+            if read is not None and written is not None and read(decoded[pc][1]) not in written:
+                self.issues.append((pc, 'warning', f"reads 0x{read(decoded[pc][1]):02X} before anything writes it "
+                                                   f"in '{interpreter.program[pc]}'"))
+
+        # Unreachable runs of lines, reported once per run
+        start = None
+        for pc in range(len(decoded) + 1):
+            if pc < len(decoded) and pc not in entry:
+                start = pc if start is None else start
+            elif start is not None:
+                where = f"line {start}" if start == pc - 1 else f"lines {start}-{pc - 1}"
+                self.issues.append((start, 'warning', f"unreachable code at {where}"))
+                start = None
+        self.issues.sort(key=lambda issue: issue[0])
+
+    def report(self):
+        """Format the findings as text."""
+        errors = sum(1 for issue in self.issues if issue[1] == 'error')
+        lines = [f"Analysis: {len(self.successors)} lines, {len(self.blocks)} blocks, "
+                 f"{len(self.successors) - len(self.reachable)} unreachable, {errors} errors, "
+                 f"{len(self.issues) - errors} warnings"]
+        for pc, severity, message in self.issues:
+            lines.append(f"line {pc}: {severity}: {message}")
+        return '\n'.join(lines)
+
+    def apply(self):
+        """Give execute_program decoded records that skip checks this analysis proved unnecessary."""
+        interpreter = self.interpreter
+        verified = []
+        for pc, (handler, operand) in enumerate(interpreter.decoded):
+            unchecked = UNCHECKED.get(handler.__name__)
+            if unchecked is not None and pc in self.byte_lines:
+                handler = getattr(interpreter, unchecked)
+            verified.append((handler, operand))
+        interpreter.verified = (interpreter.decoded, verified)
+
+
+# Trace files: stream the records back, or convert them to CSV
+def read_trace(filename):
+    """Yield (step, pc, opcode name, accumulator, flags, write address or None, written value) per traced instruction."""
+    names = {opcode: name[len('exec_'):] for name, (opcode, layout) in OPCODES.items()}
+    names[TRACE_TEXT] = 'text'
+    names[TRACE_UNKNOWN] = 'unknown'
+    size = TRACE_RECORD.size
+    with open(filename, 'rb') as f:
+        header = f.read(len(TRACE_MAGIC) + 1)
+        if header[:len(TRACE_MAGIC)] != TRACE_MAGIC:
+            raise ValueError("Not a SAP-3 trace")
+        if header[-1] != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version {header[-1]}")
+        while True:
+            chunk = f.read(size * TRACE_BUFFER)
+            if len(chunk) % size:
+                chunk = chunk[:len(chunk) - len(chunk) % size]  # A run cut short leaves a partial record
+            if not chunk:
+                return
+            for step, pc, accumulator, address, opcode, flags, value in TRACE_RECORD.iter_unpack(chunk):
+                yield (step, pc, names.get(opcode, f"0x{opcode:02X}"), accumulator, flags,
+                       address if address >= 0 else None, value)
+
+
+def write_trace_csv(filename, out):
+    """Write a trace file to the text file out as CSV, one row per instruction."""
+    import csv
+
+    writer = csv.writer(out)
+    writer.writerow(['step', 'pc', 'opcode', 'accumulator', 'zero', 'carry', 'write_address', 'write_value'])
+    for step, pc, opcode, accumulator, flags, address, value in read_trace(filename):
+        writer.writerow([step, pc, opcode, accumulator, int(bool(flags & FLAG_ZERO)), int(bool(flags & FLAG_CARRY)),
+                         '' if address is None else f"0x{address:03X}", '' if address is None else value])
+
+
+# Inspecting images, memory and snapshots: disassembly, hex/ASCII dumps and diffs, written out in bulk
+MNEMONICS = {
+    'exec_skip': "NOP", 'exec_lda': "LDA 0x{0:02X}", 'exec_sta': "STA 0x{0:02X}", 'exec_ldr': "LDR R{0}, 0x{1:02X}",
+    'exec_str': "STR R{0}, 0x{1:02X}", 'exec_ldri': "LDI R{0}, {1}", 'exec_mov': "MOV R{0}, R{1}",
+    'exec_mov_to_a': "MOV R{0}, A", 'exec_mov_from_a': "MOV A, R{0}", 'exec_add': "ADD 0x{0:02X}",
+    'exec_add_reg': "ADD R{0}", 'exec_sub': "SUB 0x{0:02X}", 'exec_and': "AND 0x{0:02X}", 'exec_or': "OR 0x{0:02X}",
+    'exec_xor': "XOR 0x{0:02X}", 'exec_jmp': "JMP {0}", 'exec_jz': "JZ {0}", 'exec_jnz': "JNZ {0}", 'exec_jc': "JC {0}",
+    'exec_jnc': "JNC {0}", 'exec_cma': "CMA", 'exec_inc': "INC", 'exec_dec': "DEC", 'exec_ral': "RAL",
+    'exec_rar': "RAR", 'exec_inp': "INP", 'exec_out': "OUT", 'exec_out_reg': "OUT R{0}", 'exec_push': "PUSH",
+    'exec_pop': "POP", 'exec_note': "NOTE {0}", 'exec_hlt': "HLT",
+}
+# Opcode byte -> (handler name, mnemonic template, operand layout, operand size)
+DISASSEMBLY = {opcode: (name, MNEMONICS[name], layout, OPERAND_SIZES[layout]) for name, (opcode, layout) in OPCODES.items()}
+PRINTABLE = bytes(value if 0x20 <= value < 0x7F else 0x2E for value in range(256))  # Other bytes show as '.'
+
+
+def operand_fields(layout, raw):
+    """Split an instruction's operand bytes into the fields of its layout."""
+    if layout in ('a', 't', 'n'):
+        return (raw[1] | (raw[2] << 8),)
+    if layout == 'r':
+        return (raw[1],)
+    if layout == 'ra':
+        return (raw[1], raw[2] | (raw[3] << 8))
+    if layout in ('rr', 'ri'):
+        return (raw[1], raw[2])
+    return ()
+
+
+def disassemble(memory, start, end, labels=None, notes=()):
+    """Yield one text line per instruction between start and end, with label lines before labelled addresses.
+
+    Jump targets are shown by label where one exists; bytes that are not an opcode are shown as DB.
+    """
+    names = {}
+    for label, address in (labels or {}).items():
+        names.setdefault(address, label)
+    code = bytes(memory[start:end])
+    records = []
+    i = 0
+    while i < len(code):
+        entry = DISASSEMBLY.get(code[i])
+        if entry is not None and i + 1 + entry[3] > len(code):
+            entry = None  # Cut off by the end of the range
+        size = 1 if entry is None else 1 + entry[3]
+        records.append((start + i, code[i:i + size], entry))
+        i += size
+    # JC targets the instruction after its label, like the interpreter
+    previous = {address: before for (before, _, _), (address, _, _) in zip(records, records[1:])}
+
+    for address, raw, entry in records:
+        if address in names:
+            yield f"{names[address]}:"
+        if entry is None:
+            text = f"DB 0x{raw[0]:02X}"
+        else:
+            name, template, layout, size = entry
+            fields = operand_fields(layout, raw)
+            if layout == 't':
+                target = previous.get(fields[0]) if name == 'exec_jc' else fields[0]
+                fields = (names.get(target, f"0x{fields[0]:04X}"),)
+            elif layout == 'n':
+                fields = (notes[fields[0]] if fields[0] < len(notes) else f'"<note {fields[0]}>"',)
+            text = template.format(*fields)
+        yield f"{address:04X}: {raw.hex(' ').upper():<12} {text}"
+
+
+def hex_dump(memory, start=0, end=None, squeeze=True):
+    """Yield hex/ASCII lines of 16 bytes each; with squeeze, runs of all-zero rows become one '*' line."""
+    end = len(memory) if end is None else min(end, len(memory))
+    data = bytes(memory[start:end])
+    zero = bytes(16)
+    skipping = False
+    for i in range(0, len(data), 16):
+        row = data[i:i + 16]
+        if squeeze and row == zero:
+            if not skipping:
+                yield "*"
+                skipping = True
+            continue
+        skipping = False
+        yield f"{start + i:04X}: {row.hex(' ').upper():<47}  |{row.translate(PRINTABLE).decode('ascii')}|"
+
+
+def diff_memory(old, new, start=0, end=None):
+    """Yield a '-' line (old) and a '+' line (new) for every 16-byte row that differs."""
+    end = max(len(old), len(new)) if end is None else end
+    before = bytes(old[start:end]).ljust(end - start, b'\0')
+    after = bytes(new[start:end]).ljust(end - start, b'\0')
+    if before == after:
+        return
+    for i in range(0, len(before), 16):
+        a = before[i:i + 16]
+        b = after[i:i + 16]
+        if a != b:
+            yield f"-{start + i:04X}: {a.hex(' ').upper()}"
+            yield f"+{start + i:04X}: {b.hex(' ').upper()}"
+
+
+def diff_states(old, new, start=0, end=None):
+    """Yield the registers and memory rows that differ between two SAP3States."""
+    for name in ('accumulator', 'pc', 'sp', 'flags', 'halt'):
+        if getattr(old, name) != getattr(new, name):
+            yield f"{name}: {getattr(old, name)} -> {getattr(new, name)}"
+    for i, (a, b) in enumerate(zip(old.registers, new.registers)):
+        if a != b:
+            yield f"R{i:02}: {a} -> {b}"
+    yield from diff_memory(old.memory, new.memory, start, end)
+
+
+def load_for_inspection(filename, memory_size=DEFAULT_MEMORY_SIZE, banks=1):
+    """Load a snapshot, a binary image, or a source file (assembled into memory) for the inspector."""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    interpreter = SAP3Interpreter(SAP3State(memory_size, banks))
+    if data.startswith(SNAPSHOT_MAGIC):
+        interpreter.restore(data)
+    elif data.startswith(IMAGE_MAGIC):
+        interpreter.load_image(data)
+    else:
+        interpreter.load_program(filename)
+        interpreter.load_image(interpreter.assemble())
+    return interpreter
+
+
+def parse_range(text):
+    """Parse an address range 'START:END' (END exclusive, either may be left out) into (start, end)."""
+    start, _, end = text.partition(':')
+    return (int(start, 0) if start else 0, int(end, 0) if end else None)
+
+
+def write_lines(lines, out, chunk=4096):
+    """Write text lines to out in large joined chunks instead of one write per line."""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk:
+            out.write('\n'.join(buffer) + '\n')
+            buffer = []
+    if buffer:
+        out.write('\n'.join(buffer) + '\n')
+
+
+# Batch runs: many programs, one fresh interpreter each, spread over worker processes
+DEFAULT_MAX_STEPS = 1_000_000
+DEFAULT_TIME_LIMIT = 10.0  # Seconds per program in a batch
+
+
+def collect_programs(target):
+    """List the programs in a directory (*.asm) or in a manifest file (one path per line, # comments)."""
+    if os.path.isdir(target):
+        return sorted(os.path.join(target, name) for name in os.listdir(target) if name.endswith('.asm'))
+    base = os.path.dirname(target)
+    programs = []
+    with open(target, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                programs.append(os.path.join(base, line))
+    return programs
+
+
+def run_program_file(filename, max_steps=DEFAULT_MAX_STEPS, time_limit=DEFAULT_TIME_LIMIT, detect_loops=True, use_cache=True):
+    """Run one program in a fresh interpreter and return its final state as a JSON-ready dict."""
+    interpreter = SAP3Interpreter()
+    output = io.StringIO()
+    result = {'program': filename}
+    try:
+        with contextlib.redirect_stdout(output):
+            if use_cache:
+                interpreter.load_program(filename)
+            else:
+                interpreter.parse_program(filename)
+            interpreter.execute_program(max_steps=max_steps, time_limit=time_limit, detect_loops=detect_loops)
+        result['status'] = interpreter.stop_reason
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['steps'] = interpreter.steps
+    result['output'] = output.getvalue().splitlines()
+    result['state'] = interpreter.state_dict()
+    return result
+
+
+def run_batch(programs, max_steps=DEFAULT_MAX_STEPS, workers=None, time_limit=DEFAULT_TIME_LIMIT, detect_loops=True,
+              use_cache=True):
+    """Run many programs across worker processes and return their results in input order."""
+    programs = list(programs)
+    if not programs:
+        return []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Hand out programs in chunks so process round trips don't dominate short programs
+        chunksize = max(1, len(programs) // ((workers or os.cpu_count() or 1) * 4))
+        count = len(programs)
+        return list(executor.map(run_program_file, programs, [max_steps] * count, [time_limit] * count,
+                                 [detect_loops] * count, [use_cache] * count, chunksize=chunksize))
+
+
+# Benchmarks: representative programs timed in each execution mode, results saved as JSON for comparison
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+BENCHMARK_MODES = ('interpreted', 'compiled', 'image')
+
+
+def benchmark_once(filename, mode):
+    """Parse, prepare and run a program once in a fresh interpreter; return the interpreter and the timings."""
     interpreter = SAP3Interpreter()
-    interpreter.parse_program(sys.argv[1])
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        interpreter.parse_program(filename)  # Always parse: the cache would hide the parse time
+        parsed = time.perf_counter()
+        if mode == 'compiled':
+            interpreter.compile_program()
+        elif mode == 'image':
+            interpreter.load_image(interpreter.assemble())
+        else:
+            SAP3Analyzer(interpreter).apply()
+        prepared = time.perf_counter()
+        if mode == 'compiled':
+            interpreter.execute_compiled(max_steps=DEFAULT_MAX_STEPS)
+        elif mode == 'image':
+            interpreter.execute_image(max_steps=DEFAULT_MAX_STEPS)
+        else:
+            interpreter.execute_program(max_steps=DEFAULT_MAX_STEPS)
+        finished = time.perf_counter()
+    return interpreter, (parsed - start, prepared - parsed, finished - prepared)
+
+
+def run_benchmark(filename, mode, repeat=3):
+    """Time one program in one mode, keeping the best of `repeat` runs, and measure its peak memory."""
+    result = {'program': os.path.basename(filename), 'mode': mode}
+    try:
+        best = None
+        for _ in range(repeat):
+            interpreter, timings = benchmark_once(filename, mode)
+            best = timings if best is None else tuple(map(min, best, timings))
+        # tracemalloc slows everything down, so peak memory gets its own run
+        tracemalloc.start()
+        try:
+            benchmark_once(filename, mode)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+    result['status'] = interpreter.stop_reason
+    result['steps'] = interpreter.steps
+    result['parse_seconds'], result['prepare_seconds'], result['run_seconds'] = best
+    result['instructions_per_second'] = round(interpreter.steps / best[2]) if best[2] else None
+    result['peak_memory_bytes'] = peak
+    return result
+
+
+def run_benchmarks(programs, modes=BENCHMARK_MODES, repeat=3):
+    """Benchmark every program in every mode and return a JSON-ready report."""
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'results': [run_benchmark(program, mode, repeat) for program in programs for mode in modes],
+    }
+
+
+def benchmark_report(report):
+    """Format a benchmark report as a table."""
+    lines = [f"{'Program':<20} {'Mode':<12} {'Steps':>9} {'Instr/s':>12} {'Parse ms':>9} {'Run ms':>9} {'Peak KiB':>9}"]
+    for r in report['results']:
+        if r['status'] == 'error':
+            lines.append(f"{r['program']:<20} {r['mode']:<12} {r['error']}")
+            continue
+        lines.append(f"{r['program']:<20} {r['mode']:<12} {r['steps']:>9} {r['instructions_per_second'] or 0:>12,} "
+                     f"{r['parse_seconds'] * 1000:>9.2f} {r['run_seconds'] * 1000:>9.2f} {r['peak_memory_bytes'] / 1024:>9.1f}")
+    return "\n".join(lines)
+
+
+def compare_benchmarks(old, new):
+    """Format the change in throughput, parse time and peak memory between two benchmark reports."""
+    previous = {(r['program'], r['mode']): r for r in old['results'] if r['status'] != 'error'}
+    lines = [f"Compared with the run of {old['timestamp']} (Python {old['python']})",
+             f"{'Program':<20} {'Mode':<12} {'Instr/s':>9} {'Parse':>9} {'Peak':>9}"]
+    for r in new['results']:
+        before = previous.get((r['program'], r['mode']))
+        if r['status'] == 'error' or before is None:
+            continue
+        speed = r['instructions_per_second'] / before['instructions_per_second'] if before['instructions_per_second'] else 0
+        parse = before['parse_seconds'] / r['parse_seconds'] if r['parse_seconds'] else 0
+        peak = r['peak_memory_bytes'] / before['peak_memory_bytes'] if before['peak_memory_bytes'] else 0
+        lines.append(f"{r['program']:<20} {r['mode']:<12} {speed:>8.2f}x {parse:>8.2f}x {peak:>8.2f}x")
+    lines.append("(Instr/s and Parse above 1.00x are faster; Peak above 1.00x uses more memory)")
+    return "\n".join(lines)
+
+
+def report_stop(interpreter):
+    """Print why a run stopped early, if it did."""
+    if interpreter.stop_reason == 'budget':
+        print(f"\nStopped after {interpreter.steps} instructions (--max-steps)")
+    elif interpreter.stop_reason == 'timeout':
+        print(f"\nStopped after {interpreter.steps} instructions (--time-limit)")
+    elif interpreter.stop_reason == 'loop':
+        where = f"address 0x{interpreter.pc:03X}" if interpreter.code_start is not None else f"line {interpreter.pc}"
+        print(f"\nStopped after {interpreter.steps} instructions: infinite loop at {where}")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SAP-3 assembler and interpreter")
+    parser.add_argument("asm_file", nargs="?", help="SAP-3 source (.asm) or assembled image (.bin)")
+    parser.add_argument("-o", "--output", help="Assemble to this .bin image instead of running")
+    parser.add_argument("-b", "--binary", action="store_true", help="Assemble into memory and run the fetch/decode/execute core")
+    parser.add_argument("-c", "--compile", action="store_true", help="Compile basic blocks to Python functions before running")
+    parser.add_argument("--profile", action="store_true", help="Profile the interpreted run and print a hot-spot report")
+    parser.add_argument("--profile-json", metavar="FILE", help="Also write the profile report to FILE as JSON")
+    parser.add_argument("--checkpoint", metavar="FILE", help="Write a snapshot to FILE while running (see --checkpoint-every)")
+    parser.add_argument("--checkpoint-every", type=int, default=1_000_000, help="Instructions between checkpoints (default 1000000)")
+    parser.add_argument("--resume", metavar="FILE", help="Resume a run from a snapshot or checkpoint file")
+    parser.add_argument("--analyze", action="store_true", help="Check the program without running it and print the findings")
+    parser.add_argument("-d", "--debugger", action="store_true", help="Step through the program with the time-travel debugger")
+    parser.add_argument("--history", type=int, default=100_000, help="Instructions the debugger can step back (default 100000)")
+    parser.add_argument("--memory", type=lambda text: int(text, 0), default=DEFAULT_MEMORY_SIZE, metavar="BYTES",
+                        help=f"Memory size up to 0x10000 (default {DEFAULT_MEMORY_SIZE}); larger memories are paged")
+    parser.add_argument("--banks", type=int, default=1, help="Memory banks switched in the upper half of memory (default 1)")
+    parser.add_argument("--disassemble", action="store_true", help="Print the assembled code as mnemonics and exit")
+    parser.add_argument("--hexdump", action="store_true", help="Print memory as hex and ASCII and exit (zero rows squeezed to '*')")
+    parser.add_argument("--diff", metavar="OTHER", help="Print the registers and memory rows that differ from OTHER and exit")
+    parser.add_argument("--range", type=parse_range, default=(0, None), metavar="START:END",
+                        help="Address range for --disassemble, --hexdump and --diff (END exclusive)")
+    parser.add_argument("--trace", metavar="FILE", help="Write a binary trace record per executed instruction to FILE")
+    parser.add_argument("--trace-csv", metavar="TRACE", help="Print a trace file as CSV and exit")
+    parser.add_argument("--input-file", metavar="FILE", help="Bytes read by INP, one per instruction ('-' for stdin)")
+    parser.add_argument("--output-file", metavar="FILE", help="Write OUT values to FILE as bytes instead of printing them")
+    parser.add_argument("--note-log", metavar="FILE", help="Write NOTE lines to FILE instead of printing them")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse the source instead of using the parsed-program cache")
+    parser.add_argument("--batch", metavar="DIR_OR_MANIFEST", help="Run every program in a directory or manifest and print JSON results")
+    parser.add_argument("--max-steps", type=int, help=f"Stop after this many instructions (batch default {DEFAULT_MAX_STEPS})")
+    parser.add_argument("--time-limit", type=float, metavar="SECONDS", help=f"Stop after this many seconds (batch default {DEFAULT_TIME_LIMIT:g})")
+    parser.add_argument("--detect-loops", action="store_true", help="Stop when the machine repeats an exact state at a backward jump (always on for --batch)")
+    parser.add_argument("--workers", type=int, help="Worker processes for --batch (default: one per CPU)")
+    parser.add_argument("--benchmark", nargs="?", const=BENCHMARK_DIR, metavar="DIR_OR_MANIFEST",
+                        help="Time the bundled benchmark programs (or those in DIR_OR_MANIFEST) in every mode")
+    parser.add_argument("--benchmark-json", metavar="FILE", help="Save the --benchmark results to FILE as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Compare the --benchmark results with an earlier --benchmark-json FILE")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the fastest is kept (default 3)")
+    args = parser.parse_args()
+
+    if args.trace_csv:
+        write_trace_csv(args.trace_csv, sys.stdout)
+        return
+    if args.batch:
+        max_steps = args.max_steps if args.max_steps is not None else DEFAULT_MAX_STEPS
+        time_limit = args.time_limit if args.time_limit is not None else DEFAULT_TIME_LIMIT
+        results = run_batch(collect_programs(args.batch), max_steps=max_steps, workers=args.workers, time_limit=time_limit,
+                            use_cache=not args.no_cache)
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    if args.disassemble or args.hexdump or args.diff:
+        if not args.asm_file:
+            parser.error("--disassemble, --hexdump and --diff need a snapshot, .bin image or .asm file")
+        start, end = args.range
+        try:
+            interpreter = load_for_inspection(args.asm_file, args.memory, args.banks)
+            if args.diff:
+                other = load_for_inspection(args.diff, args.memory, args.banks)
+                lines = diff_states(interpreter.state, other.state, start, end)
+            elif args.disassemble:
+                lines = interpreter.disassembly(start or None, end)
+            else:
+                lines = hex_dump(interpreter.memory, start, end)
+            write_lines(lines, sys.stdout)
+        except (AssemblyError, ValueError) as e:
+            print(f"Error: {e}")
+        return
+    if args.benchmark:
+        report = run_benchmarks(collect_programs(args.benchmark), repeat=max(1, args.repeat))
+        print(benchmark_report(report))
+        if args.compare:
+            with open(args.compare, 'r') as f:
+                print()
+                print(compare_benchmarks(json.load(f), report))
+        if args.benchmark_json:
+            with open(args.benchmark_json, 'w') as f:
+                json.dump(report, f, indent=2)
+        return
+    try:
+        interpreter = SAP3Interpreter(SAP3State(args.memory, args.banks))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.input_file:
+        interpreter.input_port = InputPort.from_file(args.input_file)
+    if args.output_file:
+        interpreter.output_port = OutputPort(open(args.output_file, 'wb', buffering=0))  # The port does the buffering
+    if args.note_log:
+        interpreter.note_log = LogSink(open(args.note_log, 'w', buffering=1))  # Line buffered: one write per flush
+
+    if args.debugger and (args.time_limit is not None or args.detect_loops):
+        parser.error("--time-limit and --detect-loops don't apply to the interactive debugger")
+    limits = {'time_limit': args.time_limit, 'detect_loops': args.detect_loops}
+
+    if args.resume:
+        with open(args.resume, 'rb') as f:
+            interpreter.restore(f.read())
+        print(f"Resumed at PC {interpreter.pc} after {interpreter.steps} instructions")
+        if args.checkpoint:
+            interpreter.execute_checkpointed(args.checkpoint, args.checkpoint_every, max_steps=args.max_steps, resume=True,
+                                             **limits)
+        elif interpreter.code_start is not None:
+            interpreter.execute_image(max_steps=args.max_steps, resume=True, **limits)
+        else:
+            interpreter.execute_program(max_steps=args.max_steps, resume=True, **limits)
+        report_stop(interpreter)
+        print("\nProgram execution completed")
+        interpreter.display_state()
+        return
+    if not args.asm_file:
+        parser.error("an asm_file, --resume, --batch or --benchmark is required")
+    interpreted_only = args.profile or args.profile_json or args.trace or args.time_limit is not None or args.detect_loops
+    if args.compile and interpreted_only:
+        print("Note: -c is ignored with --profile, --trace, --time-limit and --detect-loops; running interpreted",
+              file=sys.stderr)
+
+    try:
+        if args.asm_file.endswith('.bin'):
+            with open(args.asm_file, 'rb') as f:
+                image = f.read()
+        else:
+            if args.no_cache:
+                interpreter.parse_program(args.asm_file)
+            else:
+                interpreter.load_program(args.asm_file)
+            if args.output or args.binary:
+                image = interpreter.assemble()
+    except AssemblyError as e:
+        print(f"Error: {e}")
+        return
 
-    print(f"Loaded program with {len(interpreter.program)} instructions")
-    print("Labels:", interpreter.labels)
-    print("\nStarting execution...")
+    if args.analyze:
+        print(SAP3Analyzer(interpreter).report())
+        return
 
-    interpreter.execute_program()
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(image)
+        print(f"Assembled {len(interpreter.program)} instructions into {args.output} ({len(image)} bytes)")
+        return
 
+    if args.asm_file.endswith('.bin') or args.binary:
+        interpreter.load_image(image)
+        print(f"Loaded image with {interpreter.code_end - interpreter.code_start} bytes at 0x{interpreter.code_start:03X}")
+        print("Labels:", interpreter.labels)
+        print("\nStarting execution...")
+        if args.checkpoint:
+            interpreter.execute_checkpointed(args.checkpoint, args.checkpoint_every, max_steps=args.max_steps, **limits)
+        else:
+            interpreter.execute_image(max_steps=args.max_steps, **limits)
+    else:
+        print(f"Loaded program with {len(interpreter.program)} instructions")
+        print("Labels:", interpreter.labels)
+        print("\nStarting execution...")
+        if args.debugger:
+            SAP3Debugger(interpreter, history=args.history).interact()
+        elif args.checkpoint:
+            interpreter.execute_checkpointed(args.checkpoint, args.checkpoint_every, max_steps=args.max_steps, **limits)
+        elif args.compile and not interpreted_only:
+            interpreter.execute_compiled(max_steps=args.max_steps)
+        else:
+            SAP3Analyzer(interpreter).apply()
+            interpreter.execute_program(max_steps=args.max_steps, profile=bool(args.profile or args.profile_json),
+                                        trace=args.trace, **limits)
+
+    report_stop(interpreter)
     print("\nProgram execution completed")
     interpreter.display_state()
 
+    if interpreter.profile:
+        print(interpreter.profile_report())
+        if args.profile_json:
+            with open(args.profile_json, 'w') as f:
+                json.dump(interpreter.profile_dict(), f, indent=2)
+
 if __name__ == "__main__":
     main()
 
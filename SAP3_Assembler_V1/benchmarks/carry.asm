@@ -0,0 +1,31 @@
+; Benchmark: carry arithmetic
+; Adds 200 into a 16-bit total (low byte 0x30, high byte 0x31), 250 x 40 times,
+; carrying into the high byte whenever the low byte overflows.
+
+        LDI R1, 0
+        STR R1, 0x30
+        STR R1, 0x31
+        LDI R1, 200
+        STR R1, 0x32    ; Addend
+        LDI R1, 40
+        MOV R1, A
+        STA 0x21        ; Outer counter
+OUTER:  LDI R2, 250
+        MOV R2, A
+        STA 0x20        ; Inner counter
+LOOP:   LDA 0x30
+        ADD 0x32
+        STA 0x30
+        JNC NOCARRY
+        LDA 0x31
+        INC
+        STA 0x31
+NOCARRY: LDA 0x20
+        DEC
+        STA 0x20
+        JNZ LOOP
+        LDA 0x21
+        DEC
+        STA 0x21
+        JNZ OUTER
+        HLT
@@ -0,0 +1,15 @@
+; Benchmark: counting loops
+; An inner DEC/JNZ loop of 250 runs 250 times under an outer counter kept in memory.
+
+        LDI R1, 250
+        MOV R1, A
+        STA 0x20        ; Outer counter
+OUTER:  LDI R2, 250
+        MOV R2, A       ; Inner counter in the accumulator
+INNER:  DEC
+        JNZ INNER
+        LDA 0x20
+        DEC
+        STA 0x20
+        JNZ OUTER
+        HLT
@@ -0,0 +1,83 @@
+; Benchmark: memory copies
+; Fills 16 source bytes, then copies them to a second buffer 2000 times (250 x 8).
+
+        LDI R1, 1
+        STR R1, 0x40
+        LDI R1, 2
+        STR R1, 0x41
+        LDI R1, 3
+        STR R1, 0x42
+        LDI R1, 5
+        STR R1, 0x43
+        LDI R1, 8
+        STR R1, 0x44
+        LDI R1, 13
+        STR R1, 0x45
+        LDI R1, 21
+        STR R1, 0x46
+        LDI R1, 34
+        STR R1, 0x47
+        LDI R1, 55
+        STR R1, 0x48
+        LDI R1, 89
+        STR R1, 0x49
+        LDI R1, 144
+        STR R1, 0x4A
+        LDI R1, 233
+        STR R1, 0x4B
+        LDI R1, 99
+        STR R1, 0x4C
+        LDI R1, 42
+        STR R1, 0x4D
+        LDI R1, 7
+        STR R1, 0x4E
+        LDI R1, 255
+        STR R1, 0x4F
+
+        LDI R2, 8
+        MOV R2, A
+        STA 0x21        ; Outer counter
+OUTER:  LDI R3, 250
+        MOV R3, A
+        STA 0x20        ; Inner counter
+COPY:   LDA 0x40
+        STA 0x60
+        LDA 0x41
+        STA 0x61
+        LDA 0x42
+        STA 0x62
+        LDA 0x43
+        STA 0x63
+        LDA 0x44
+        STA 0x64
+        LDA 0x45
+        STA 0x65
+        LDA 0x46
+        STA 0x66
+        LDA 0x47
+        STA 0x67
+        LDA 0x48
+        STA 0x68
+        LDA 0x49
+        STA 0x69
+        LDA 0x4A
+        STA 0x6A
+        LDA 0x4B
+        STA 0x6B
+        LDA 0x4C
+        STA 0x6C
+        LDA 0x4D
+        STA 0x6D
+        LDA 0x4E
+        STA 0x6E
+        LDA 0x4F
+        STA 0x6F
+        LDA 0x20
+        DEC
+        STA 0x20
+        JNZ COPY
+        LDA 0x21
+        DEC
+        STA 0x21
+        JNZ OUTER
+        HLT
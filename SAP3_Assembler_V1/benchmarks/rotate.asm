@@ -0,0 +1,38 @@
+; Benchmark: rotate-heavy code
+; Rotates a byte left and right eight times each and mixes in a key, 250 x 20 times.
+
+        LDI R1, 90
+        STR R1, 0x30    ; Key
+        LDI R1, 0
+        STR R1, 0x31    ; Value
+        LDI R1, 20
+        MOV R1, A
+        STA 0x21        ; Outer counter
+OUTER:  LDI R2, 250
+        MOV R2, A
+        STA 0x20        ; Inner counter
+LOOP:   LDA 0x31
+        RAL
+        RAL
+        RAL
+        RAL
+        RAL
+        RAL
+        RAL
+        RAR
+        RAR
+        RAR
+        RAR
+        RAR
+        XOR 0x30
+        INC
+        STA 0x31
+        LDA 0x20
+        DEC
+        STA 0x20
+        JNZ LOOP
+        LDA 0x21
+        DEC
+        STA 0x21
+        JNZ OUTER
+        HLT
@@ -0,0 +1,43 @@
+; Benchmark: stack-heavy code
+; Pushes eight values and pops them back in reverse, 250 x 20 times.
+
+        LDI R1, 20
+        MOV R1, A
+        STA 0x21        ; Outer counter
+OUTER:  LDI R2, 250
+        MOV R2, A
+        STA 0x20        ; Inner counter
+LOOP:   LDI R3, 1
+        MOV R3, A
+        PUSH
+        INC
+        PUSH
+        INC
+        PUSH
+        INC
+        PUSH
+        RAL
+        PUSH
+        RAL
+        PUSH
+        CMA
+        PUSH
+        DEC
+        PUSH
+        POP
+        POP
+        POP
+        POP
+        POP
+        POP
+        POP
+        POP
+        LDA 0x20
+        DEC
+        STA 0x20
+        JNZ LOOP
+        LDA 0x21
+        DEC
+        STA 0x21
+        JNZ OUTER
+        HLT
@@ -0,0 +1,8 @@
+; Backward JC loop whose state repeats exactly: 255 + 255 always carries
+LDI R1, 255
+STR R1, 0x10
+L: NOP
+LDA 0x10
+ADD 0x10
+JC L
+HLT
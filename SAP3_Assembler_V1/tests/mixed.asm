@@ -0,0 +1,35 @@
+; Touches most instructions, for the differential tests: every run mode must end in the same state
+        LDI R1, 200
+        STR R1, 0x30
+        LDRI R2, 48
+        LDR R3, 0x30
+        MOV R3, A
+        ADD 0x30        ; Carries
+        JC CARRIED
+        OUT
+CARRIED: NOP           ; JC resumes after its label
+        OUT R2
+        LDI R4, 5
+        MOV R4, A
+LOOP:   PUSH
+        DEC
+        JNZ LOOP
+        POP
+        POP
+        SUB 0x30
+        AND 0x30
+        OR 0x30
+        XOR 0x30
+        CMA
+        RAL
+        RAR
+        INC
+        STA 0x40
+        ADD R1
+        JNC SKIP
+        OUT
+SKIP:   LDA 0x30
+        JZ DONE
+        NOTE "A={A} R1={R1} mem={0x40}"
+        OUT
+DONE:   HLT
@@ -0,0 +1,232 @@
+"""Tests for SAP-3_Assembler.py: run with  python -m pytest SAP3_Assembler_V1/tests  (or python -m unittest)."""
+import contextlib
+import importlib.util
+import io
+import glob
+import os
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BENCHMARKS = os.path.join(ROOT, 'benchmarks')
+
+# The script's name has a hyphen, so it is loaded from its path
+spec = importlib.util.spec_from_file_location('sap3', os.path.join(ROOT, 'SAP-3_Assembler.py'))
+sap3 = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sap3)
+
+
+def quiet(function, *args, **kwargs):
+    """Call function with its printed output captured; returns (result, output)."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = function(*args, **kwargs)
+    return result, out.getvalue()
+
+
+def run_state(filename):
+    """The final state snapshot of an uninterrupted interpreted run."""
+    interpreter = sap3.SAP3Interpreter()
+    interpreter.parse_program(filename)
+    quiet(interpreter.execute_program)
+    return interpreter.state.snapshot()
+
+
+def image_interpreter(filename):
+    """An interpreter with filename assembled and loaded as an image."""
+    interpreter = sap3.SAP3Interpreter()
+    interpreter.parse_program(filename)
+    interpreter.load_image(interpreter.assemble())
+    return interpreter
+
+
+# Programs every run mode must agree on
+PROGRAMS = sorted(glob.glob(os.path.join(BENCHMARKS, '*.asm'))) + [
+    os.path.join(ROOT, 'Sample-CMD-Test.asm'),
+    os.path.join(HERE, 'mixed.asm'),
+]
+MODES = ('interpreted', 'analyzed', 'compiled', 'image')
+
+
+def run_mode(filename, mode, max_steps=None):
+    """Run filename in one mode; returns what every mode must agree on."""
+    interpreter = sap3.SAP3Interpreter()
+    interpreter.parse_program(filename)
+    interpreter.output_port = sap3.OutputPort()
+    if mode == 'analyzed':
+        sap3.SAP3Analyzer(interpreter).apply()
+    elif mode == 'image':
+        interpreter.load_image(interpreter.assemble())
+    run = {'interpreted': interpreter.execute_program, 'analyzed': interpreter.execute_program,
+           'compiled': interpreter.execute_compiled, 'image': interpreter.execute_image}[mode]
+    _, printed = quiet(run, max_steps=max_steps)
+    return result_of(interpreter.state, interpreter.output_port.values, printed, interpreter.steps,
+                     interpreter.stop_reason)
+
+
+def result_of(st, outputs, printed, steps, stop_reason):
+    # The PC is a line number or a byte address depending on the mode, and images add code above the data
+    return {
+        'outputs': list(outputs),
+        'printed': printed,
+        'accumulator': st.accumulator,
+        'flags': st.flags,
+        'sp': st.sp,
+        'registers': bytes(st.registers),
+        'memory': bytes(st.memory[:sap3.DEFAULT_MEMORY_SIZE]),
+        'steps': steps,
+        'stop_reason': stop_reason,
+    }
+
+
+class DifferentialTests(unittest.TestCase):
+
+    def test_modes_agree(self):
+        for program in PROGRAMS:
+            expected = run_mode(program, 'interpreted')
+            for mode in MODES[1:]:
+                with self.subTest(program=os.path.basename(program), mode=mode):
+                    self.assertEqual(run_mode(program, mode), expected)
+
+    def test_modes_agree_on_budget(self):
+        program = os.path.join(BENCHMARKS, 'count_loop.asm')
+        expected = run_mode(program, 'interpreted', max_steps=5000)
+        self.assertEqual(expected['stop_reason'], 'budget')
+        for mode in ('analyzed', 'image'):
+            with self.subTest(mode=mode):
+                self.assertEqual(run_mode(program, mode, max_steps=5000), expected)
+
+    def test_lanes_agree_with_interpreter(self):
+        if sap3.np is None:
+            self.skipTest("NumPy is not installed")
+        program = os.path.join(HERE, 'mixed.asm')
+        # Lanes start from different values at 0x30, the byte the program works on
+        starts = []
+        for value in (0, 1, 100, 200, 255):
+            st = sap3.SAP3State()
+            st.memory[0x30] = value
+            starts.append(st)
+
+        interpreter = sap3.SAP3Interpreter()
+        interpreter.parse_program(program)
+        lanes = sap3.SAP3Lanes.from_states(interpreter, starts)
+        lanes.run()
+        for lane, start in enumerate(starts):
+            single = sap3.SAP3Interpreter(sap3.SAP3State())
+            single.parse_program(program)
+            single.state.restore(start.snapshot())
+            single.output_port = sap3.OutputPort()
+            quiet(single.execute_program)
+            with self.subTest(lane=lane):
+                got = lanes.state(lane)
+                self.assertEqual(lanes.outputs[lane], single.output_port.values)
+                for name in ('accumulator', 'flags', 'sp', 'pc', 'halt'):
+                    self.assertEqual(getattr(got, name), getattr(single.state, name), name)
+                self.assertEqual(bytes(got.registers), bytes(single.state.registers))
+                self.assertEqual(bytes(got.memory), bytes(single.state.memory))
+
+
+class SnapshotTests(unittest.TestCase):
+
+    def test_snapshot_round_trip(self):
+        interpreter = sap3.SAP3Interpreter()
+        interpreter.parse_program(os.path.join(HERE, 'mixed.asm'))
+        quiet(interpreter.execute_program, max_steps=20)
+        copy = sap3.SAP3Interpreter.from_snapshot(interpreter.snapshot())
+        self.assertEqual(copy.snapshot(), interpreter.snapshot())
+
+    def test_resume_matches_uninterrupted_run(self):
+        for program in PROGRAMS:
+            expected = run_mode(program, 'interpreted')
+            interpreter = sap3.SAP3Interpreter()
+            interpreter.parse_program(program)
+            quiet(interpreter.execute_program, max_steps=expected['steps'] // 2)
+            resumed = sap3.SAP3Interpreter.from_snapshot(interpreter.snapshot())
+            quiet(resumed.execute_program, resume=True)
+            with self.subTest(program=os.path.basename(program)):
+                self.assertEqual(resumed.state.snapshot(), run_state(program))
+
+
+class CheckpointTests(unittest.TestCase):
+
+    def test_resume_image_snapshot_with_checkpoints(self):
+        program = os.path.join(BENCHMARKS, 'count_loop.asm')
+        expected = image_interpreter(program)
+        quiet(expected.execute_image)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            first = os.path.join(tmp, 'first.snap')
+            interpreter = image_interpreter(program)
+            quiet(interpreter.execute_checkpointed, first, 1000, max_steps=1000)
+            self.assertEqual(interpreter.stop_reason, 'budget')
+
+            resumed = sap3.SAP3Interpreter()
+            with open(first, 'rb') as f:
+                resumed.restore(f.read())
+            quiet(resumed.execute_checkpointed, os.path.join(tmp, 'second.snap'), 1000, resume=True)
+
+        self.assertEqual(resumed.stop_reason, expected.stop_reason)
+        self.assertEqual(resumed.steps, expected.steps)
+        self.assertEqual(resumed.state.snapshot(), expected.state.snapshot())
+
+
+class FakeState:
+    def __init__(self, data):
+        self.data = data
+
+    def snapshot(self):
+        return self.data
+
+
+class WatchdogTests(unittest.TestCase):
+
+    def setUp(self):
+        # Every state hashes the same, as in a worst-case collision
+        sap3.hash = lambda data: 0
+
+    def tearDown(self):
+        del sap3.hash
+
+    def test_hash_collisions_are_not_loops(self):
+        watchdog = sap3.Watchdog(detect_loops=True)
+        for n in range(100):
+            self.assertFalse(watchdog.repeated(FakeState(bytes([n]))))
+
+    def test_exact_repeat_is_a_loop(self):
+        watchdog = sap3.Watchdog(detect_loops=True)
+        states = [FakeState(b'a'), FakeState(b'b')]
+        results = [watchdog.repeated(state) for state in states * 3]
+        self.assertTrue(any(results))
+
+    def test_loop_detected_in_every_mode(self):
+        program = os.path.join(HERE, 'jc_loop.asm')
+        for run in ('execute_program', 'execute_image'):
+            interpreter = sap3.SAP3Interpreter()
+            interpreter.parse_program(program)
+            if run == 'execute_image':
+                interpreter.load_image(interpreter.assemble())
+            quiet(getattr(interpreter, run), max_steps=100_000, detect_loops=True)
+            self.assertEqual(interpreter.stop_reason, 'loop', run)
+
+
+class DebuggerTests(unittest.TestCase):
+
+    def test_push_with_negative_stack_pointer_steps_back(self):
+        interpreter = sap3.SAP3Interpreter()
+        interpreter.parse_lines(['LDI R1, 7', 'MOV R1, A', 'PUSH', 'PUSH', 'HLT'])
+        interpreter.state.sp = 0
+        before = None
+        debugger = sap3.SAP3Debugger(interpreter)
+        for _ in range(4):
+            if interpreter.pc == 3:
+                before = interpreter.state.snapshot()
+            quiet(debugger.step)
+        self.assertEqual(interpreter.state.sp, -2)
+        self.assertEqual(interpreter.memory[-1], 7)
+        debugger.back()
+        self.assertEqual(interpreter.state.snapshot(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,21 +29,8 @@ Compression Format:
 - Decoding reverses this process and reconstructs the original text.
 """
 
-# Print explanation when the program starts
-print(__doc__)
-print("\n\n")
-
-import sys
-import shutil
-
-# Define your custom 64-character set
-CHARSET = "abcdefghijklmnopqrstuvwxyz0123456789 -_.,:+!?=^"
-
-# Create lookup tables
-char_to_index = {c: i for i, c in enumerate(CHARSET)}
-index_to_char = {i: c for i, c in enumerate(CHARSET)}
-
-SHIFT_CHAR = "^"
+import sixbit
+from sixbit import CHARSET, SHIFT_CHAR, char_to_index, index_to_char
 
 # Sanitize input: remove characters not in CHARSET, but allow ^ for internal case handling
 def sanitize_input(text: str) -> str:
@@ -85,63 +72,54 @@ def from_internal_format(text: bytearray) -> str:
 
 # Encodes text to compact 6-bit format using bytearray.
 def encode_6bit(text: str) -> bytearray:
-    sanitized_text = sanitize_input(text)  # Ensure only valid characters are in the input
-    bits = ''
-    for c in sanitized_text:
-        bits += format(char_to_index[chr(c)], '06b')  # Convert character byte to 6-bit binary
-
-    # Pad to byte boundary
-    if len(bits) % 8 != 0:
-        bits += '0' * (8 - len(bits) % 8)
-
-    # Convert the bits to bytearray
-    encoded = bytearray()
-    for i in range(0, len(bits), 8):
-        byte = int(bits[i:i+8], 2)
-        encoded.append(byte)
-    return encoded
+    return bytearray(sixbit.encode(text))
 
 # Decodes compact 6-bit bytes to text.
 def decode_6bit(data: bytearray) -> str:
-    bits = ''.join(format(b, '08b') for b in data)
-    chars = []
-    for i in range(0, len(bits), 6):
-        chunk = bits[i:i+6]
-        if len(chunk) < 6:
-            break
-        idx = int(chunk, 2)
-        if idx < len(CHARSET):
-            chars.append(index_to_char[idx])
-    return ''.join(chars)
+    return sixbit.decode(data)
 
 # Running Examples
-print("Running Test Routine:")
-print(f"-" * shutil.get_terminal_size().columns)
+def main() -> None:
+    import shutil
+
+    # Print explanation when the program starts
+    print(__doc__)
+    print("\n\n")
+
+    print("Running Test Routine:")
+    print(f"-" * shutil.get_terminal_size().columns)
+
+    original_text = "Each Bit And Byte Represents A Unique Value In The Digital World."
+    print(f"        Original: bytes[{len(original_text.encode('utf-8'))}]:  {original_text}")
+
+    # Convert the original text into internal format
+    internal = to_internal_format(original_text)
+    print(f" Internal format: bytes[{len(internal)}]:  {internal.decode('utf-8', 'ignore')}")
 
-original_text = "Each Bit And Byte Represents A Unique Value In The Digital World."
-print(f"        Original: bytes[{len(original_text.encode('utf-8'))}]:  {original_text}")
+    # Encode the internal format to 6-bit
+    encoded = encode_6bit(internal.decode('utf-8', 'ignore'))
+    print(f"   Encoded (hex): bytes[{len(encoded)}]:  {encoded.hex()}")
 
-# Convert the original text into internal format
-internal = to_internal_format(original_text)
-print(f" Internal format: bytes[{len(internal)}]:  {internal.decode('utf-8', 'ignore')}")
+    # Decode the encoded data back to internal format
+    decoded_internal = decode_6bit(encoded)
+    print(f"Decoded internal: bytes[{len(decoded_internal.encode('utf-8'))}]:  {decoded_internal}")
 
-# Encode the internal format to 6-bit
-encoded = encode_6bit(internal.decode('utf-8', 'ignore'))
-print(f"   Encoded (hex): bytes[{len(encoded)}]:  {encoded.hex()}")
+    # Convert the internal format back to the original text
+    final_text = from_internal_format(bytearray(decoded_internal, 'utf-8'))
+    print(f"    Final output: bytes[{len(final_text.encode('utf-8'))}]:  {final_text}\n")
 
-# Decode the encoded data back to internal format
-decoded_internal = decode_6bit(encoded)
-print(f"Decoded internal: bytes[{len(decoded_internal.encode('utf-8'))}]:  {decoded_internal}")
+    # Calculate and display percentage of bytes saved
+    original_size = len(original_text.encode('utf-8'))
+    final_size = len(encoded)
 
-# Convert the internal format back to the original text
-final_text = from_internal_format(bytearray(decoded_internal, 'utf-8'))
-print(f"    Final output: bytes[{len(final_text.encode('utf-8'))}]:  {final_text}\n")
+    # Calculate percentage saved
+    percentage_saved = abs((original_size - final_size) / original_size) * 100
 
-# Calculate and display percentage of bytes saved
-original_size = len(original_text.encode('utf-8'))
-final_size = len(encoded)
+    print(f"Percentage of bytes saved: {percentage_saved:.2f}%\n")
 
-# Calculate percentage saved
-percentage_saved = abs((original_size - final_size) / original_size) * 100
+    print("Running Benchmark:")
+    print(f"-" * shutil.get_terminal_size().columns)
+    sixbit.benchmark(internal.decode('utf-8', 'ignore'))
 
-print(f"Percentage of bytes saved: {percentage_saved:.2f}%\n")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,636 @@
+"""
+6-Bit Text Encoding System with Uppercase Support
+-------------------------------------------------
+
+This module implements a compact text encoding system using a custom 64-character set,
+where each character is stored using only 6 bits (instead of the usual 8 for ASCII).
+This is ideal for saving space when you only need a limited and safe set of characters.
+
+Supported Characters (64 total):
+--------------------------------
+- Lowercase letters:     a-z
+- Digits:                0-9
+- Common symbols:        - _ . , : + ! ? = /
+- Space:                 ' ' (space)
+- Shift character:       ^  (used to indicate that the next character is uppercase)
+
+Uppercase Handling:
+-------------------
+- To save space, uppercase letters are not stored directly.
+- Instead, a special marker character (`^`) is used.
+  For example: "HELLO" → "^h^e^l^l^o"
+- This keeps all characters within the 64-character limit and still preserves full case.
+
+Compression Format:
+-------------------
+- Input is converted to internal format using ^ for uppercase letters.
+- Each character is mapped to a 6-bit index (0-63).
+- All 6-bit values are packed into bytes for compact storage.
+- Decoding reverses this process and reconstructs the original text.
+
+Library Use:
+------------
+    import sixbit
+    data = sixbit.encode(sixbit.to_internal_format("Hello World"))
+    text = sixbit.from_internal_format(sixbit.decode(data))
+
+Large inputs can be streamed in constant memory with Encoder and Decoder, or from the
+command line:  python sixbit.py -e < text.txt > text.6b  and  python sixbit.py -d < text.6b
+Line breaks are outside the character set; pass lines=True (or --lines) on both sides to encode
+them as one more symbol.
+
+Many records can be stored in one container file with write_records() and looked up one at a
+time, without decoding the others, through RecordFile.
+
+Importing the module has no side effects; run it as a script for the demo.
+"""
+
+# Define your custom 64-character set
+CHARSET = "abcdefghijklmnopqrstuvwxyz0123456789 -_.,:+!?=^"
+
+# Create lookup tables
+char_to_index = {c: i for i, c in enumerate(CHARSET)}
+index_to_char = {i: c for i, c in enumerate(CHARSET)}
+
+SHIFT_CHAR = "^"
+
+DEMO_TEXT = "Each Bit And Byte Represents A Unique Value In The Digital World."
+
+# Sanitize input: remove characters not in CHARSET, but allow ^ for internal case handling
+def sanitize_input(text: str) -> str:
+    sanitized_text = []
+    for c in text:
+        if c.lower() not in CHARSET and c != SHIFT_CHAR:
+            raise ValueError(f"Unsupported character: {c}")
+        sanitized_text.append(c)
+    return ''.join(sanitized_text)
+
+# Convert text with uppercase to internal format using ^ marker.
+def to_internal_format(text: str) -> str:
+    text = sanitize_input(text)  # Ensure only valid characters are in the input
+    result = []
+    for c in text:
+        if c.isupper():
+            result.append(SHIFT_CHAR)
+            result.append(c.lower())
+        else:
+            result.append(c)
+    return ''.join(result)
+
+# Convert internal format (with ^ markers) back to text with uppercase.
+def from_internal_format(text: str) -> str:
+    result = []
+    skip = False
+    for i, c in enumerate(text):
+        if skip:
+            skip = False
+            continue
+        if c == SHIFT_CHAR and i + 1 < len(text):
+            result.append(text[i + 1].upper())
+            skip = True
+        else:
+            result.append(c)
+    return ''.join(result)
+
+# Lookup tables for the codec: character <-> 6-bit index, plus one table per shifted bit field
+INVALID = 0xFF
+ENCODE_TABLE = bytes(char_to_index.get(chr(b), INVALID) for b in range(256))
+DECODE_TABLE = bytes(ord(index_to_char.get(b, '\0')) for b in range(256))
+UNUSED_INDEXES = bytes(range(len(CHARSET), 256))  # Indexes with no character are dropped when decoding
+
+# Opt-in alphabet (lines=True): a line break takes the first free index. Off by default, so the
+# default alphabet, and what existing data decodes to, stays as it was
+LINE_BREAK = "\n"
+LINE_CHARSET = CHARSET + LINE_BREAK
+LINE_ENCODE_TABLE = bytes(LINE_CHARSET.index(chr(b)) if chr(b) in LINE_CHARSET else INVALID for b in range(256))
+LINE_DECODE_TABLE = bytes(ord(LINE_CHARSET[b]) if b < len(LINE_CHARSET) else 0 for b in range(256))
+LINE_UNUSED_INDEXES = bytes(range(len(LINE_CHARSET), 256))
+
+# A last group holding only three symbols gets this index, which no character uses, as its padding
+# symbol. Every decoder drops it (the original bit-string one too), so no 'a' appears at the end
+PAD_INDEX = 0x3F
+
+# Maps every byte to (byte & mask) shifted left (shift > 0) or right (shift < 0), kept to 8 bits
+def shift_table(shift: int, mask: int = 0xFF) -> bytes:
+    if shift >= 0:
+        return bytes(((b & mask) << shift) & 0xFF for b in range(256))
+    return bytes((b & mask) >> -shift for b in range(256))
+
+# Four 6-bit symbols a b c d pack into three bytes: aaaaaabb bbbbcccc ccdddddd
+A_TO_BYTE0, B_TO_BYTE0 = shift_table(2, 0x3F), shift_table(-4)
+B_TO_BYTE1, C_TO_BYTE1 = shift_table(4, 0x0F), shift_table(-2)
+C_TO_BYTE2, D_TO_BYTE2 = shift_table(6, 0x03), shift_table(0, 0x3F)
+BYTE0_TO_A, BYTE0_TO_B = shift_table(-2), shift_table(4, 0x03)
+BYTE1_TO_B, BYTE1_TO_C = shift_table(-4), shift_table(2, 0x0F)
+BYTE2_TO_C, BYTE2_TO_D = shift_table(-6), shift_table(0, 0x3F)
+
+# Bitwise OR of two equal-length byte strings, done on big integers so it runs at C speed
+def or_bytes(x: bytes, y: bytes) -> bytes:
+    return (int.from_bytes(x, 'big') | int.from_bytes(y, 'big')).to_bytes(len(x), 'big')
+
+# Encodes internal-format text to compact 6-bit format (with line breaks allowed if lines).
+# Whole streams are handled at once: every 4th symbol is sliced out, shifted into place through a
+# lookup table, OR-ed together and interleaved into the output, so there is no per-character loop.
+def encode(text: str, lines: bool = False) -> bytes:
+    try:
+        indexes = text.encode('ascii').translate(LINE_ENCODE_TABLE if lines else ENCODE_TABLE)
+    except UnicodeEncodeError as e:
+        raise ValueError(f"Unsupported character: {text[e.start]}") from None
+    bad = indexes.find(INVALID)
+    if bad >= 0:
+        if text[bad] in '\r\n':
+            raise ValueError("Unsupported character: line break (encode with lines=True, or --lines)")
+        raise ValueError(f"Unsupported character: {text[bad]}")
+
+    count = len(indexes)
+    if count % 4 == 3:
+        indexes += bytes([PAD_INDEX])
+    indexes += bytes(-len(indexes) % 4)  # Pad to whole groups of four symbols
+    a, b, c, d = indexes[0::4], indexes[1::4], indexes[2::4], indexes[3::4]
+    packed = bytearray(len(a) * 3)
+    packed[0::3] = or_bytes(a.translate(A_TO_BYTE0), b.translate(B_TO_BYTE0))
+    packed[1::3] = or_bytes(b.translate(B_TO_BYTE1), c.translate(C_TO_BYTE1))
+    packed[2::3] = or_bytes(c.translate(C_TO_BYTE2), d.translate(D_TO_BYTE2))
+    del packed[(count * 6 + 7) // 8:]  # Only the bytes the bits reach (the last one padded with 0 bits)
+    return bytes(packed)
+
+# Decodes compact 6-bit bytes (bytes, bytearray or memoryview) to internal-format text.
+def decode(data: bytes, lines: bool = False) -> str:
+    data = bytes(data)
+    count = len(data) * 8 // 6  # Every whole 6-bit group, like reading the bits six at a time
+    data += bytes(-len(data) % 3)
+    x, y, z = data[0::3], data[1::3], data[2::3]
+    indexes = bytearray(len(x) * 4)
+    indexes[0::4] = x.translate(BYTE0_TO_A)
+    indexes[1::4] = or_bytes(x.translate(BYTE0_TO_B), y.translate(BYTE1_TO_B))
+    indexes[2::4] = or_bytes(y.translate(BYTE1_TO_C), z.translate(BYTE2_TO_C))
+    indexes[3::4] = z.translate(BYTE2_TO_D)
+    del indexes[count:]
+    if lines:
+        return indexes.translate(LINE_DECODE_TABLE, LINE_UNUSED_INDEXES).decode('ascii')
+    return indexes.translate(DECODE_TABLE, UNUSED_INDEXES).decode('ascii')
+
+# Streaming: Encoder and Decoder take input chunk by chunk, so memory use does not grow with the input
+CHUNK_SIZE = 1 << 16
+UPPERCASE = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Like to_internal_format, but one replace per uppercase letter present (much faster than str.translate here)
+def add_shifts(text: str) -> str:
+    for c in UPPERCASE:
+        if c in text:
+            text = text.replace(c, SHIFT_CHAR + c.lower())
+    return text
+
+# Like from_internal_format, but working between markers instead of character by character
+def restore_shifts(text: str) -> str:
+    if SHIFT_CHAR * 2 not in text and not text.endswith(SHIFT_CHAR):
+        # Every marker is followed by its own character, so plain replaces give the same result
+        for c in UPPERCASE:
+            marked = SHIFT_CHAR + c.lower()
+            if marked in text:
+                text = text.replace(marked, c)
+        return text.replace(SHIFT_CHAR, '')  # Markers before digits and symbols change nothing
+    parts = text.split(SHIFT_CHAR)
+    result = [parts[0]]
+    i = 1
+    while i < len(parts):
+        part = parts[i]
+        if part:
+            result.append(part[0].upper())  # The letter after a marker
+            result.append(part[1:])
+            i += 1
+        else:
+            result.append(SHIFT_CHAR)  # A marker followed by a ^; the next part is plain text
+            if i + 1 < len(parts):
+                result.append(parts[i + 1])
+            i += 2
+    return ''.join(result)
+
+class Encoder:
+    """Packs text into 6-bit bytes chunk by chunk.
+
+    Uppercase letters are converted to ^ markers unless internal is set, and line breaks are
+    allowed if lines is. Symbols short of a whole group of four wait for the next chunk, and
+    finish() packs them with the final padding, so the output is exactly encode() of the whole text.
+    """
+
+    def __init__(self, internal: bool = False, lines: bool = False):
+        self.internal = internal
+        self.lines = lines
+        self.pending = ''
+
+    def encode(self, text: str) -> bytes:
+        if not self.internal:
+            text = add_shifts(text)
+        text = self.pending + text
+        whole = len(text) - len(text) % 4
+        self.pending = text[whole:]
+        return encode(text[:whole], self.lines)
+
+    def finish(self) -> bytes:
+        text, self.pending = self.pending, ''
+        return encode(text, self.lines)
+
+class Decoder:
+    """Unpacks 6-bit bytes chunk by chunk.
+
+    Bytes short of a whole three-byte group wait for the next chunk. Uppercase letters are restored
+    from ^ markers unless internal is set; a marker at the end of a chunk waits for its letter.
+    Line breaks are decoded if lines is set.
+    """
+
+    def __init__(self, internal: bool = False, lines: bool = False):
+        self.internal = internal
+        self.lines = lines
+        self.pending = b''
+        self.shift = ''
+
+    def decode(self, data: bytes) -> str:
+        data = self.pending + bytes(data)
+        whole = len(data) - len(data) % 3
+        self.pending = data[whole:]
+        return self.restore_case(decode(data[:whole], self.lines))
+
+    def finish(self) -> str:
+        data, self.pending = self.pending, b''
+        text = self.restore_case(decode(data, self.lines)) + self.shift  # A final marker has no letter and stays a ^
+        self.shift = ''
+        return text
+
+    def restore_case(self, text: str) -> str:
+        if self.internal:
+            return text
+        text = self.shift + text
+        # Markers pair up from the start of a run of ^, so an odd run leaves the last one unpaired
+        run = len(text) - len(text.rstrip(SHIFT_CHAR))
+        if run % 2:
+            text, self.shift = text[:-1], SHIFT_CHAR
+        else:
+            self.shift = ''
+        return restore_shifts(text)
+
+# Encode a text stream into a binary stream (or back with decode_stream), one chunk at a time
+def encode_stream(source, target, internal: bool = False, chunk_size: int = CHUNK_SIZE, lines: bool = False) -> None:
+    encoder = Encoder(internal, lines)
+    while chunk := source.read(chunk_size):
+        target.write(encoder.encode(chunk))
+    target.write(encoder.finish())
+
+def decode_stream(source, target, internal: bool = False, chunk_size: int = CHUNK_SIZE, lines: bool = False) -> None:
+    decoder = Decoder(internal, lines)
+    while chunk := source.read(chunk_size):
+        target.write(decoder.decode(chunk))
+    target.write(decoder.finish())
+
+# Bulk: NumPy versions for many records at once. NumPy is imported on first use, so `import sixbit`
+# stays fast and works without it. Each record is packed on its own, exactly like the scalar codec.
+RAW_TABLE = bytes(char_to_index.get(chr(b).lower() if 65 <= b <= 90 else chr(b), INVALID) for b in range(256))
+
+# Start offset of each of a set of consecutive lengths, plus the total at the end
+def offsets(np, lengths):
+    result = np.zeros(len(lengths) + 1, np.int64)
+    np.cumsum(lengths, out=result[1:])
+    return result
+
+# Encodes many texts at once; each result equals encode(to_internal_format(text)), or encode(text) if internal.
+def encode_many(records, internal: bool = False) -> list:
+    import numpy as np
+
+    records = list(records)
+    joined = ''.join(records)
+    try:
+        raw = np.frombuffer(joined.encode('ascii'), np.uint8)
+    except UnicodeEncodeError as e:
+        raise ValueError(f"Unsupported character: {joined[e.start]}") from None
+    indexes = np.frombuffer(ENCODE_TABLE if internal else RAW_TABLE, np.uint8)[raw]
+    bad = np.flatnonzero(indexes == INVALID)
+    if bad.size:
+        raise ValueError(f"Unsupported character: {joined[bad[0]]}")
+
+    # Uppercase letters take two symbols: the ^ marker, then the lowercase letter
+    upper = np.zeros(len(raw), bool) if internal else (raw >= 65) & (raw <= 90)
+    expanded = offsets(np, 1 + upper.astype(np.int64))
+    bounds = offsets(np, np.fromiter(map(len, records), np.int64, len(records)))
+    counts = expanded[bounds[1:]] - expanded[bounds[:-1]]  # Symbols per record
+    starts = offsets(np, (counts + 3) // 4 * 4)  # Each record padded to whole groups of four
+    record = np.repeat(np.arange(len(records)), np.diff(bounds))
+    position = expanded[:-1] + (starts[:-1] - expanded[bounds[:-1]])[record]
+
+    symbols = np.zeros(starts[-1], np.uint8)
+    symbols[position + upper] = indexes
+    symbols[position[upper]] = char_to_index[SHIFT_CHAR]
+    symbols[starts[1:][counts % 4 == 3] - 1] = PAD_INDEX
+
+    # Four 6-bit symbols a b c d pack into three bytes: aaaaaabb bbbbcccc ccdddddd
+    a, b, c, d = symbols.reshape(-1, 4).T
+    packed = np.empty((len(a), 3), np.uint8)
+    packed[:, 0] = (a << 2) | (b >> 4)
+    packed[:, 1] = ((b & 0x0F) << 4) | (c >> 2)
+    packed[:, 2] = ((c & 0x03) << 6) | d
+    data = packed.tobytes()
+    sizes = (counts * 6 + 7) // 8
+    return [data[start:start + size] for start, size in zip((starts[:-1] // 4 * 3).tolist(), sizes.tolist())]
+
+# Decodes many byte strings at once; each result equals from_internal_format(decode(data)), or decode(data) if internal.
+def decode_many(records, internal: bool = False) -> list:
+    import numpy as np
+
+    records = list(records)
+    sizes = np.fromiter(map(len, records), np.int64, len(records))
+    bounds = offsets(np, sizes)
+    groups = offsets(np, (sizes + 2) // 3)  # Each record padded to whole three-byte groups
+    data = np.zeros(groups[-1] * 3, np.uint8)
+    raw = np.frombuffer(b''.join(records), np.uint8)
+    data[np.arange(len(raw)) + np.repeat(groups[:-1] * 3 - bounds[:-1], sizes)] = raw
+
+    x, y, z = data.reshape(-1, 3).T
+    symbols = np.empty((len(x), 4), np.uint8)
+    symbols[:, 0] = x >> 2
+    symbols[:, 1] = ((x & 0x03) << 4) | (y >> 4)
+    symbols[:, 2] = ((y & 0x0F) << 2) | (z >> 6)
+    symbols[:, 3] = z & 0x3F
+    symbols = symbols.ravel()
+
+    # Drop indexes with no character, and the padding symbols in the last group of a record
+    # with one (three padding symbols) or two (two padding symbols) bytes in it
+    keep = symbols < len(CHARSET)
+    ends = groups[1:] * 4
+    padding = np.array([0, 3, 2])[sizes % 3]
+    for k in (1, 2, 3):
+        keep[ends[padding >= k] - k] = False
+    char_bounds = offsets(np, keep)[groups * 4]
+    chars = np.frombuffer(DECODE_TABLE, np.uint8)[symbols[keep]]
+
+    if not internal:
+        # A marker uppercases the next character of its record and is dropped; a ^ that ends a record stays
+        shift = chars == ord(SHIFT_CHAR)
+        marker = shift.copy()
+        if (shift[1:] & shift[:-1]).any():
+            # Markers pair up from the start of each run of ^, and runs stop at record boundaries
+            run_start = shift.copy()
+            run_start[1:] &= ~shift[:-1]
+            firsts = char_bounds[:-1][char_bounds[:-1] < len(chars)]
+            run_start[firsts] = shift[firsts]
+            index = np.arange(len(chars))
+            marker &= (index - np.maximum.accumulate(np.where(run_start, index, 0))) % 2 == 0
+        marker[char_bounds[1:][char_bounds[1:] > char_bounds[:-1]] - 1] = False
+        targets = np.flatnonzero(marker) + 1
+        targets = targets[chars[targets] >= ord('a')]  # Letters; every other character is its own uppercase
+        chars[targets] -= 32
+        char_bounds -= offsets(np, marker)[char_bounds]
+        chars = chars[~marker]
+
+    text = chars.tobytes().decode('ascii')
+    return [text[start:end] for start, end in zip(char_bounds[:-1].tolist(), char_bounds[1:].tolist())]
+
+# Benchmark: encode and decode speed, in MB of text per second
+def best_time(run, repeat: int) -> float:
+    import time
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def benchmark(text: str, size: int = 4 * 1024 * 1024, repeat: int = 3) -> None:
+    text = (text * (size // len(text) + 1))[:size]
+    encoded = encode(text)
+    if decode(encoded)[:size] != text:
+        raise AssertionError("Round trip failed")
+    timings = {"Encode": best_time(lambda: encode(text), repeat),
+               "Decode": best_time(lambda: decode(encoded), repeat)}
+    for name, elapsed in timings.items():
+        print(f"{name:>6}: {size / 1e6:.1f} MB of text in {elapsed * 1000:.1f} ms  ({size / 1e6 / elapsed:.1f} MB/s)")
+    print()
+
+# Container files: many records packed back to back, with their symbol counts and an offset index
+#   header  magic, version, record count, index position
+#   data    the internal-format symbols of every record, packed as one stream
+#   index   record count + 1 symbol offsets (uint64); record k is symbols index[k] to index[k + 1]
+CONTAINER_MAGIC = b'6BIT'
+CONTAINER_VERSION = 1
+CONTAINER_HEADER = '<4sBxxxQQ'
+INDEX_ENTRY = '<Q'
+
+# Writes records (text, or internal format if internal) to a container file, streaming the data as it goes.
+# The file is built under a temporary name and only replaces path once complete, so a record that fails
+# to encode leaves no truncated container behind.
+def write_records(path: str, records, internal: bool = False) -> int:
+    import os
+    import struct
+    import sys
+    from array import array
+
+    offsets = array('Q', [0])
+    encoder = Encoder(internal=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp, 'wb') as f:
+            f.write(bytes(struct.calcsize(CONTAINER_HEADER)))  # Filled in once the record count is known
+            batch = []
+            size = 0
+            for record in records:
+                text = record if internal else add_shifts(record)
+                batch.append(text)
+                size += len(text)
+                offsets.append(offsets[-1] + len(text))
+                if size >= CHUNK_SIZE:
+                    f.write(encoder.encode(''.join(batch)))
+                    batch = []
+                    size = 0
+            f.write(encoder.encode(''.join(batch)))
+            f.write(encoder.finish())
+
+            index_position = f.tell()
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            f.write(offsets.tobytes())
+            f.seek(0)
+            f.write(struct.pack(CONTAINER_HEADER, CONTAINER_MAGIC, CONTAINER_VERSION, len(offsets) - 1, index_position))
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return len(offsets) - 1
+
+class RecordFile:
+    """A container file written by write_records, memory-mapped for random access.
+
+    records[k] reads two index entries and decodes only the bytes of record k, so any record is
+    found in constant time however many come before it. Exact symbol counts mean padding bits
+    are never decoded as characters.
+    """
+
+    def __init__(self, path: str, internal: bool = False):
+        import mmap
+        import struct
+
+        self.internal = internal
+        self.entry = struct.Struct(INDEX_ENTRY)
+        self.data_start = struct.calcsize(CONTAINER_HEADER)
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < self.data_start:
+            self.close()
+            raise ValueError(f"{path} is not a 6-bit container")
+        magic, version, self.count, self.index_position = struct.unpack_from(CONTAINER_HEADER, self.map)
+        if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {CONTAINER_VERSION} 6-bit container")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, k: int) -> str:
+        if k < 0:
+            k += self.count
+        if not 0 <= k < self.count:
+            raise IndexError("record index out of range")
+        position = self.index_position + k * self.entry.size
+        (start,) = self.entry.unpack_from(self.map, position)
+        (end,) = self.entry.unpack_from(self.map, position + self.entry.size)
+        # Decode from the start of the three-byte group holding the first symbol, then trim to the record
+        first = self.data_start + start // 4 * 3
+        last = self.data_start + (end * 6 + 7) // 8
+        skip = start % 4
+        text = decode(self.map[first:last])[skip:skip + end - start]
+        return text if self.internal else restore_shifts(text)
+
+    def __iter__(self):
+        for k in range(self.count):
+            yield self[k]
+
+    def close(self) -> None:
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Bulk benchmark: many short records through the scalar functions one by one, then through the NumPy path
+def benchmark_many(text: str, count: int = 200_000, repeat: int = 3) -> None:
+    records = [text[i % len(text):][:8 + i % 40] for i in range(count)]
+    encoded = encode_many(records)
+    if encoded != [encode(to_internal_format(record)) for record in records]:
+        raise AssertionError("encode_many differs from encode")
+    timings = {
+        "Encode": (best_time(lambda: [encode(to_internal_format(record)) for record in records], 1),
+                   best_time(lambda: encode_many(records), repeat)),
+        "Decode": (best_time(lambda: [from_internal_format(decode(data)) for data in encoded], 1),
+                   best_time(lambda: decode_many(encoded), repeat)),
+    }
+    for name, (scalar, bulk) in timings.items():
+        print(f"{name:>6}: {count:,} records in {scalar * 1000:.0f} ms one by one, {bulk * 1000:.0f} ms with NumPy"
+              f"  ({scalar / bulk:.1f}x faster)")
+    print()
+
+# Running Examples: print each step of the round trip for one text
+def demo(original_text: str = DEMO_TEXT) -> None:
+    import shutil
+
+    print("Running Test Routine:")
+    print(f"-" * shutil.get_terminal_size().columns)
+
+    print(f"        Original: bytes[{len(original_text.encode('utf-8'))}]:  {original_text}")
+
+    # Convert the original text into internal format
+    internal = to_internal_format(original_text)
+    print(f" Internal format: bytes[{len(internal.encode('utf-8'))}]:  {internal}")
+
+    # Encode the internal format to 6-bit
+    encoded = encode(internal)
+    print(f"   Encoded (hex): bytes[{len(encoded)}]:  {encoded.hex()}")
+
+    # Decode the encoded data back to internal format
+    decoded_internal = decode(encoded)
+    print(f"Decoded internal: bytes[{len(decoded_internal.encode('utf-8'))}]:  {decoded_internal}")
+
+    # Convert the internal format back to the original text
+    final_text = from_internal_format(decoded_internal)
+    print(f"    Final output: bytes[{len(final_text.encode('utf-8'))}]:  {final_text}\n")
+
+    # Calculate and display percentage of bytes saved
+    original_size = len(original_text.encode('utf-8'))
+    final_size = len(encoded)
+
+    # Calculate percentage saved
+    percentage_saved = abs((original_size - final_size) / original_size) * 100
+
+    print(f"Percentage of bytes saved: {percentage_saved:.2f}%\n")
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="6-bit text encoding demo")
+    parser.add_argument("text", nargs="?", default=DEMO_TEXT, help="Text to run through the encoder (default: a sample sentence)")
+    parser.add_argument("--benchmark", action="store_true", help="Also print encode and decode speed in MB/s")
+    parser.add_argument("-e", "--encode", action="store_true", help="Encode text from stdin to 6-bit bytes on stdout")
+    parser.add_argument("-d", "--decode", action="store_true", help="Decode 6-bit bytes from stdin to text on stdout")
+    parser.add_argument("--internal", action="store_true", help="With -e/-d, keep ^ markers instead of converting case")
+    parser.add_argument("--lines", action="store_true", help="With -e/-d, encode line breaks as a symbol of their own")
+    parser.add_argument("--pack", metavar="FILE", help="Store each line of stdin as a record in the container FILE")
+    parser.add_argument("--record", nargs=2, metavar=("FILE", "K"), help="Print record K of the container FILE")
+    args = parser.parse_args()
+
+    if args.pack:
+        import sys
+
+        lines = (line.rstrip('\r\n') for line in sys.stdin)
+        try:
+            count = write_records(args.pack, lines)
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        print(f"Packed {count} records into {args.pack}")
+        return
+    if args.record:
+        import sys
+
+        try:
+            with RecordFile(args.record[0]) as records:
+                print(records[int(args.record[1])])
+        except (ValueError, IndexError) as e:
+            sys.exit(f"Error: {e}")
+        return
+
+    if args.encode or args.decode:
+        import io
+        import sys
+
+        try:
+            if args.encode:
+                # Universal newlines: with --lines, \r\n and \r line endings are encoded as \n
+                source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline=None)
+                encode_stream(source, sys.stdout.buffer, args.internal, lines=args.lines)
+            else:
+                target = io.TextIOWrapper(sys.stdout.buffer, encoding='ascii', newline='', write_through=True)
+                decode_stream(sys.stdin.buffer, target, args.internal, lines=args.lines)
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        return
+
+    # Print explanation when the program starts
+    print(__doc__)
+    print("\n\n")
+    try:
+        demo(args.text)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.benchmark:
+        print("Running Benchmark:")
+        benchmark(to_internal_format(args.text))
+        try:
+            import numpy
+        except ImportError:
+            print("NumPy is not installed, so the bulk functions are not benchmarked.\n")
+        else:
+            print("Running Bulk Benchmark:")
+            benchmark_many(args.text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Tests for sixbit.py: run with  python -m pytest Utils/6-Bit_Text/tests  (or python -m unittest)."""
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sixbit
+
+TEXT_CHARS = sixbit.CHARSET.replace(sixbit.SHIFT_CHAR, '') + "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def random_text(rng, length, chars=TEXT_CHARS):
+    return ''.join(rng.choice(chars) for _ in range(length))
+
+
+def stream_encode(text, chunk_size, **options):
+    out = io.BytesIO()
+    sixbit.encode_stream(io.StringIO(text), out, chunk_size=chunk_size, **options)
+    return out.getvalue()
+
+
+def stream_decode(data, chunk_size, **options):
+    out = io.StringIO()
+    sixbit.decode_stream(io.BytesIO(data), out, chunk_size=chunk_size, **options)
+    return out.getvalue()
+
+
+class PaddingTests(unittest.TestCase):
+
+    def test_every_length_round_trips(self):
+        rng = random.Random(1)
+        for length in range(64):
+            internal = random_text(rng, length, sixbit.CHARSET.replace(sixbit.SHIFT_CHAR, ''))
+            self.assertEqual(sixbit.decode(sixbit.encode(internal)), internal, length)
+
+    def test_streaming_matches_encode(self):
+        rng = random.Random(2)
+        for length in range(64):
+            text = random_text(rng, length)
+            expected = sixbit.encode(sixbit.to_internal_format(text))
+            for chunk_size in (1, 3, 7, 64):
+                self.assertEqual(stream_encode(text, chunk_size), expected, (length, chunk_size))
+                self.assertEqual(stream_decode(expected, chunk_size), text, (length, chunk_size))
+
+    def test_markers_across_chunk_boundaries(self):
+        rng = random.Random(5)
+        # Runs of ^ and uppercase letters, so markers keep landing at the ends of chunks
+        for _ in range(300):
+            internal = random_text(rng, rng.randrange(40), "ab^^^")
+            data = sixbit.encode(internal)
+            expected = sixbit.from_internal_format(sixbit.decode(data))
+            for chunk_size in (1, 2, 3):
+                self.assertEqual(stream_decode(data, chunk_size), expected, internal)
+                self.assertEqual(stream_decode(data, chunk_size, internal=True), internal)
+
+    def test_bulk_matches_encode(self):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+        rng = random.Random(3)
+        texts = [random_text(rng, rng.randrange(40)) for _ in range(500)]
+        packed = sixbit.encode_many(texts)
+        self.assertEqual(packed, [sixbit.encode(sixbit.to_internal_format(text)) for text in texts])
+        self.assertEqual(sixbit.decode_many(packed), texts)
+
+
+class LineBreakTests(unittest.TestCase):
+
+    def test_line_breaks_need_the_option(self):
+        with self.assertRaises(ValueError):
+            sixbit.encode("two\nlines")
+
+    def test_line_breaks_round_trip(self):
+        text = "First Line\nsecond, line!\n\nEnd"
+        data = stream_encode(text, 5, lines=True)
+        self.assertEqual(data, sixbit.encode(sixbit.add_shifts(text), lines=True))
+        self.assertEqual(stream_decode(data, 4, lines=True), text)
+
+    def test_default_alphabet_unchanged(self):
+        self.assertEqual(len(sixbit.CHARSET), 47)
+        # The line-break index decodes to nothing without lines, as unused indexes always have
+        self.assertEqual(sixbit.decode(sixbit.encode("a\nb", lines=True)), "ab")
+
+class RecordFileTests(unittest.TestCase):
+
+    def test_records_round_trip(self):
+        rng = random.Random(4)
+        records = [random_text(rng, rng.randrange(30)) for _ in range(2000)] + ['', 'abc', 'ABC', 'x^']
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'records.6b')
+            self.assertEqual(sixbit.write_records(path, records), len(records))
+            with sixbit.RecordFile(path) as container:
+                self.assertEqual(len(container), len(records))
+                self.assertEqual(list(container), records)
+                self.assertEqual(container[-1], records[-1])
+                with self.assertRaises(IndexError):
+                    container[len(records)]
+
+    def test_invalid_record_leaves_existing_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'records.6b')
+            sixbit.write_records(path, ['kept'])
+            with self.assertRaises(ValueError):
+                sixbit.write_records(path, ['fine'] * 10 + ['bad~'])
+            self.assertEqual(os.listdir(tmp), ['records.6b'])
+            with sixbit.RecordFile(path) as container:
+                self.assertEqual(list(container), ['kept'])
+
+
+if __name__ == '__main__':
+    unittest.main()